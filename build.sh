@@ -4,6 +4,8 @@ set -o errexit
 pip install -r requirements.txt
 python manage.py collectstatic --no-input
 python manage.py migrate
+python manage.py reconcile_seats
+python manage.py rebuild_analytics
 python manage.py shell <<'PY'
 import os
 from django.contrib.auth import get_user_model
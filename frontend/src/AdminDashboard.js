@@ -1,14 +1,19 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import api from './api';
 import './Dashboard.css';
 
 function AdminDashboard({ user }) {
   const [activeTab, setActiveTab] = useState('routes');
-  const [routes, setRoutes] = useState([]);
-  const [buses, setBuses] = useState([]);
-  const [schedules, setSchedules] = useState([]);
-  const [bookings, setBookings] = useState([]);
-  const [users, setUsers] = useState([]);
+  // Id -> row maps from /dashboard/; refreshes only fetch what changed.
+  const [routeMap, setRouteMap] = useState({});
+  const [busMap, setBusMap] = useState({});
+  const [scheduleMap, setScheduleMap] = useState({});
+  const [bookingMap, setBookingMap] = useState({});
+  const [userMap, setUserMap] = useState({});
+  const [bookingsNext, setBookingsNext] = useState(null);
+  const since = useRef(null);
+  const [analytics, setAnalytics] = useState(null);
+  const [analyticsGroup, setAnalyticsGroup] = useState('route');
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
@@ -31,21 +36,39 @@ function AdminDashboard({ user }) {
     fetchData();
   }, []);
 
+  useEffect(() => {
+    if (activeTab !== 'analytics') return;
+    api
+      .get('/analytics/', { params: { group: analyticsGroup } })
+      .then((response) => setAnalytics(response.data))
+      .catch(() => setError('Failed to load analytics'));
+  }, [activeTab, analyticsGroup]);
+
+  const formatRate = (value) => (value === null ? '-' : `${(value * 100).toFixed(1)}%`);
+
+  const merge = (current, changed, removed = []) => {
+    const next = { ...current, ...changed };
+    removed.forEach((id) => delete next[id]);
+    return next;
+  };
+
   const fetchData = async () => {
     setError('');
     try {
-      const [routesRes, busesRes, schedulesRes, bookingsRes, usersRes] = await Promise.all([
-        api.get('/routes/'),
-        api.get('/buses/'),
-        api.get('/schedules/'),
-        api.get('/bookings/'),
-        api.get('/users/'),
-      ]);
-      setRoutes(routesRes.data);
-      setBuses(busesRes.data);
-      setSchedules(schedulesRes.data);
-      setBookings(bookingsRes.data);
-      setUsers(usersRes.data.filter((account) => !account.is_staff));
+      const params = since.current ? { since: since.current } : {};
+      const { data } = await api.get('/dashboard/', { params });
+      const deleted = data.full ? {} : data.deleted;
+      const apply = (setter, changed, removed) =>
+        setter((current) => merge(data.full ? {} : current, changed, removed));
+      apply(setRouteMap, data.routes, deleted.routes);
+      apply(setBusMap, data.buses, deleted.buses);
+      apply(setScheduleMap, data.schedules, deleted.schedules);
+      apply(setUserMap, data.users, deleted.users);
+      apply(setBookingMap, data.bookings, deleted.bookings);
+      if (data.full) {
+        setBookingsNext(data.bookings_next);
+      }
+      since.current = data.server_time;
     } catch (err) {
       setError('Failed to load admin data');
     } finally {
@@ -53,6 +76,42 @@ function AdminDashboard({ user }) {
     }
   };
 
+  const loadMoreBookings = async () => {
+    try {
+      const response = await api.get(bookingsNext);
+      setBookingMap((current) =>
+        merge(current, Object.fromEntries(response.data.results.map((booking) => [booking.id, booking])))
+      );
+      setBookingsNext(response.data.next);
+    } catch (err) {
+      setError('Failed to load more bookings');
+    }
+  };
+
+  const routes = Object.values(routeMap);
+  const buses = Object.values(busMap);
+  const users = Object.values(userMap).filter((account) => !account.is_staff);
+  const schedules = Object.values(scheduleMap)
+    .map((schedule) => ({
+      ...schedule,
+      route_details: routeMap[schedule.route],
+      bus_name: busMap[schedule.bus]?.bus_name,
+      bus_number: busMap[schedule.bus]?.bus_number,
+    }))
+    .sort((a, b) => new Date(a.departure_time) - new Date(b.departure_time) || a.id - b.id);
+  // Bookings of a deleted schedule or user went with it.
+  const bookings = Object.values(bookingMap)
+    .filter((booking) => scheduleMap[booking.schedule] && userMap[booking.user])
+    .map((booking) => {
+      const route = routeMap[scheduleMap[booking.schedule].route];
+      return {
+        ...booking,
+        schedule_route: route ? `${route.from_location} → ${route.to_location}` : booking.schedule_route,
+        user_username: userMap[booking.user].username,
+      };
+    })
+    .sort((a, b) => b.id - a.id);
+
   const clearMessages = () => {
     setError('');
     setSuccess('');
@@ -205,6 +264,9 @@ function AdminDashboard({ user }) {
         <button className={activeTab === 'bookings' ? 'tab-btn active' : 'tab-btn'} onClick={() => setActiveTab('bookings')}>
           Bookings
         </button>
+        <button className={activeTab === 'analytics' ? 'tab-btn active' : 'tab-btn'} onClick={() => setActiveTab('analytics')}>
+          Analytics
+        </button>
       </div>
 
       <div className="tab-content">
@@ -483,9 +545,53 @@ function AdminDashboard({ user }) {
                   </div>
                 </div>
               ))}
+              {bookingsNext && (
+                <button type="button" className="btn-secondary" onClick={loadMoreBookings}>
+                  Load more bookings
+                </button>
+              )}
             </div>
           </>
         )}
+
+        {activeTab === 'analytics' && (
+          <>
+            <h2>Last 30 Days</h2>
+            <select value={analyticsGroup} onChange={(e) => setAnalyticsGroup(e.target.value)}>
+              <option value="route">By route</option>
+              <option value="bus">By bus</option>
+              <option value="day">By day</option>
+            </select>
+
+            {analytics && (
+              <div className="items-list">
+                <div className="item-card">
+                  <div>
+                    <h4>All departures</h4>
+                    <p>Revenue: {analytics.totals.revenue}</p>
+                    <p>Load factor: {formatRate(analytics.totals.load_factor)}</p>
+                    <p>Cancellation rate: {formatRate(analytics.totals.cancellation_rate)}</p>
+                    <p>
+                      Seats sold: {analytics.totals.confirmed} / {analytics.totals.seats} on {analytics.totals.schedules} trips
+                    </p>
+                  </div>
+                </div>
+                {analytics.results.length === 0 && <p>No departures in this period.</p>}
+                {analytics.results.map((row) => (
+                  <div key={row[analytics.group]} className="item-card">
+                    <div>
+                      <h4>{row.label || row.day}</h4>
+                      <p>Revenue: {row.revenue}</p>
+                      <p>Load factor: {formatRate(row.load_factor)}</p>
+                      <p>Cancellation rate: {formatRate(row.cancellation_rate)}</p>
+                      <p>Trips: {row.schedules}</p>
+                    </div>
+                  </div>
+                ))}
+              </div>
+            )}
+          </>
+        )}
       </div>
     </div>
   );
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import api from './api';
+import api, { API_BASE_URL, fetchAllPages } from './api';
 import './Dashboard.css';
 
 function UserDashboard({ user }) {
@@ -23,8 +23,7 @@ function UserDashboard({ user }) {
 
   const fetchRoutes = async () => {
     try {
-      const response = await api.get('/routes/');
-      setRoutes(response.data);
+      setRoutes(await fetchAllPages('/routes/'));
     } catch (err) {
       console.error('Failed to load routes');
     }
@@ -32,8 +31,7 @@ function UserDashboard({ user }) {
 
   const fetchSchedules = async () => {
     try {
-      const response = await api.get('/schedules/');
-      setSchedules(response.data);
+      setSchedules(await fetchAllPages('/schedules/'));
     } catch (err) {
       setError('Failed to load schedules');
     } finally {
@@ -51,8 +49,7 @@ function UserDashboard({ user }) {
 
   const fetchBookings = async () => {
     try {
-      const response = await api.get('/bookings/');
-      setBookings(response.data);
+      setBookings(await fetchAllPages('/bookings/'));
     } catch (err) {
       console.error('Failed to load bookings');
     }
@@ -71,6 +68,33 @@ function UserDashboard({ user }) {
     }
   };
 
+  // Keep the seat picker live while it is open instead of polling.
+  useEffect(() => {
+    if (!bookingModal || !selectedSchedule) return undefined;
+    const source = new EventSource(`${API_BASE_URL}/schedules/${selectedSchedule.id}/seat-events/`);
+    const seatsOf = (event) => JSON.parse(event.data).seats;
+
+    source.addEventListener('snapshot', (event) => {
+      setAvailableSeats(JSON.parse(event.data).available_seats);
+    });
+    const removeSeats = (event) => {
+      const seats = seatsOf(event);
+      setAvailableSeats((current) => current.filter((seat) => !seats.includes(seat)));
+      setSelectedSeat((current) => (seats.includes(current) ? null : current));
+    };
+    source.addEventListener('seat-taken', removeSeats);
+    source.addEventListener('seat-held', removeSeats);
+    source.addEventListener('seat-released', (event) => {
+      const seats = seatsOf(event);
+      setAvailableSeats((current) => [...new Set([...current, ...seats])].sort((a, b) => a - b));
+    });
+    source.addEventListener('resync', async () => {
+      const response = await api.get(`/schedules/${selectedSchedule.id}/available_seats/`);
+      setAvailableSeats(response.data.available_seats);
+    });
+    return () => source.close();
+  }, [bookingModal, selectedSchedule]);
+
   const handleSelectSeat = (seatNumber) => {
     setSelectedSeat(seatNumber);
   };
@@ -6,7 +6,7 @@ const renderApiBaseUrl = 'https://ticketsystem-backend-mzog.onrender.com/api';
 const isLocalhost =
   typeof window !== 'undefined' &&
   (window.location.hostname === 'localhost' || window.location.hostname === '127.0.0.1');
-const API_BASE_URL = envApiBaseUrl || (isLocalhost ? 'http://localhost:8000/api' : renderApiBaseUrl);
+export const API_BASE_URL = envApiBaseUrl || (isLocalhost ? 'http://localhost:8000/api' : renderApiBaseUrl);
 
 const api = axios.create({
   baseURL: API_BASE_URL,
@@ -29,7 +29,8 @@ api.interceptors.response.use(
   (response) => response,
   (error) => {
     const message = error.response?.data?.detail;
-    if (typeof message === 'string' && message.toLowerCase().includes('invalid token')) {
+    const lowered = typeof message === 'string' ? message.toLowerCase() : '';
+    if (lowered.includes('invalid token') || lowered.includes('token has expired')) {
       localStorage.removeItem('token');
       localStorage.removeItem('username');
       localStorage.removeItem('is_staff');
@@ -39,4 +40,17 @@ api.interceptors.response.use(
   }
 );
 
+// List endpoints are cursor-paginated ({ next, previous, results }).
+// Follows `next` links for views that really need every row.
+export const fetchAllPages = async (url, params = {}) => {
+  const items = [];
+  let response = await api.get(url, { params: { page_size: 500, ...params } });
+  items.push(...response.data.results);
+  while (response.data.next) {
+    response = await api.get(response.data.next);
+    items.push(...response.data.results);
+  }
+  return items;
+};
+
 export default api;
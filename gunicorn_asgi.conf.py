@@ -0,0 +1,33 @@
+"""
+Gunicorn settings for serving the ASGI application with uvicorn workers:
+
+    gunicorn -c gunicorn_asgi.conf.py ticketsystemproject.asgi:application
+
+Each worker runs an event loop, so browsing clients waiting on the async
+catalog views (myapp.async_views) or holding a seat-events stream open
+don't each tie up a worker. Sync views still run one at a time per worker
+thread. The WSGI entry point (``gunicorn ticketsystemproject.wsgi:application``)
+keeps working as before.
+"""
+import os
+
+worker_class = "uvicorn_worker.UvicornWorker"
+# Async workers multiplex connections, so one serves the small instance. The
+# default seat-events broker (myapp.events.InProcessBroker) only reaches
+# streams in its own process: more workers need a cross-process broker in
+# SEAT_EVENTS_BROKER, or bookings in one worker never reach seat pickers
+# connected to another.
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+broker = os.environ.get("SEAT_EVENTS_BROKER", "myapp.events.InProcessBroker")
+if workers > 1 and broker == "myapp.events.InProcessBroker":
+    raise RuntimeError(
+        f"WEB_CONCURRENCY={workers} needs a cross-process SEAT_EVENTS_BROKER; "
+        "InProcessBroker only delivers seat events within one worker."
+    )
+# Restart a worker whose event loop has been blocked this many seconds.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound memory growth.
+max_requests = 5000
+max_requests_jitter = 500
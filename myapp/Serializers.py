@@ -1,38 +1,61 @@
 from rest_framework import serializers
-from .models import Route, Booking, Bus, Schedule
+from django.conf import settings
+from .models import ArchivedBooking, Route, Booking, Bus, Schedule, SeatHold
+from . import services
+from .exceptions import SeatUnavailable
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 
 
-class RouteSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Let GET requests ask for a subset of fields with ``?fields=id,name``."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        requested = request.query_params.get('fields')
+        if not requested:
+            return
+        wanted = {name.strip() for name in requested.split(',')}
+        for name in set(self.fields) - wanted:
+            self.fields.pop(name)
+
+
+class RouteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Route
         fields = '__all__'
 
 
-class BusSerializer(serializers.ModelSerializer):
+class BusSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Bus
         fields = '__all__'
 
 
-class ScheduleSerializer(serializers.ModelSerializer):
+class ScheduleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     route_details = RouteSerializer(source='route', read_only=True)
     bus_number = serializers.CharField(source='bus.bus_number', read_only=True)
     bus_name = serializers.CharField(source='bus.bus_name', read_only=True)
     bus_total_seats = serializers.IntegerField(source='bus.total_seats', read_only=True)
-    available_seats = serializers.SerializerMethodField(read_only=True)
+    available_seats = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Schedule
         fields = ['id', 'route', 'route_details', 'bus', 'bus_number', 'bus_name', 'bus_total_seats', 'departure_time', 'price', 'available_seats']
 
-    def get_available_seats(self, obj):
-        confirmed_bookings = Booking.objects.filter(schedule=obj, status='confirmed').count()
-        return obj.bus.total_seats - confirmed_bookings
 
+def booking_route(booking):
+    # The booking views compute the label in SQL; fall back for single objects.
+    label = getattr(booking, 'route_label', None)
+    if label is not None:
+        return label
+    return f"{booking.schedule.route.from_location} → {booking.schedule.route.to_location}"
 
-class BookingSerializer(serializers.ModelSerializer):
+
+class BookingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user_username = serializers.CharField(source='user.username', read_only=True)
     schedule_route = serializers.SerializerMethodField(read_only=True)
 
@@ -43,9 +66,12 @@ class BookingSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'user': {'required': False},
         }
+        # Seat conflicts are checked in validate() and enforced by the
+        # unique_confirmed_seat constraint; both surface as a 409.
+        validators = []
 
     def get_schedule_route(self, obj):
-        return f"{obj.schedule.route.from_location} → {obj.schedule.route.to_location}"
+        return booking_route(obj)
 
     def validate(self, data):
         instance = getattr(self, 'instance', None)
@@ -60,13 +86,99 @@ class BookingSerializer(serializers.ModelSerializer):
             existing_booking = existing_booking.exclude(pk=instance.pk)
 
         if existing_booking.exists():
-            raise serializers.ValidationError(f"Seat {seat_number} is already booked")
+            raise SeatUnavailable(seat_number)
         if seat_number < 1 or seat_number > schedule.bus.total_seats:
             raise serializers.ValidationError(f"Seat number must be between 1 and {schedule.bus.total_seats}")
         return data
+
+    def create(self, validated_data):
+        return services.create_booking(**validated_data)
+
+    def update(self, instance, validated_data):
+        # The annotated route label is stale if the schedule changes.
+        instance.__dict__.pop('route_label', None)
+        return services.update_booking(instance, **validated_data)
         
 
 
+class BookingLegSerializer(serializers.Serializer):
+    schedule = serializers.PrimaryKeyRelatedField(queryset=Schedule.objects.select_related('route', 'bus'))
+    seat_numbers = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate(self, attrs):
+        schedule = attrs['schedule']
+        seats = attrs['seat_numbers']
+        if len(set(seats)) != len(seats):
+            raise serializers.ValidationError("Seat numbers must not repeat")
+        total_seats = schedule.bus.total_seats
+        if any(seat < 1 or seat > total_seats for seat in seats):
+            raise serializers.ValidationError(f"Seat number must be between 1 and {total_seats}")
+        return attrs
+
+
+class BulkBookingSerializer(serializers.Serializer):
+    """
+    Either ``{"schedule": 1, "seat_numbers": [3, 4]}`` or, for multi-leg
+    trips, ``{"legs": [{"schedule": 1, "seat_numbers": [3]}, ...]}``.
+    """
+    MAX_SEATS = 100
+
+    legs = BookingLegSerializer(many=True, allow_empty=False)
+
+    def to_internal_value(self, data):
+        if 'legs' not in data and 'schedule' in data:
+            data = {'legs': [{'schedule': data.get('schedule'), 'seat_numbers': data.get('seat_numbers')}]}
+        return super().to_internal_value(data)
+
+    def validate_legs(self, legs):
+        schedule_ids = [leg['schedule'].pk for leg in legs]
+        if len(set(schedule_ids)) != len(schedule_ids):
+            raise serializers.ValidationError("Each schedule may appear in only one leg")
+        if sum(len(leg['seat_numbers']) for leg in legs) > self.MAX_SEATS:
+            raise serializers.ValidationError(f"At most {self.MAX_SEATS} seats can be booked at once")
+        return legs
+
+
+class SeatHoldSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SeatHold
+        fields = ['id', 'schedule', 'seat_number', 'expires_at']
+
+
+class ArchivedBookingSerializer(serializers.ModelSerializer):
+    user_username = serializers.CharField(source='user.username', read_only=True)
+    schedule_route = serializers.SerializerMethodField(read_only=True)
+    departure_time = serializers.DateTimeField(source='schedule.departure_time', read_only=True)
+
+    class Meta:
+        model = ArchivedBooking
+        fields = ['id', 'user', 'user_username', 'schedule', 'schedule_route', 'departure_time', 'seat_number', 'booked_at', 'status', 'cancelled_at']
+        read_only_fields = fields
+
+    def get_schedule_route(self, obj):
+        return booking_route(obj)
+
+
+class HoldRequestSerializer(BookingLegSerializer):
+    minutes = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_seat_numbers(self, seats):
+        if len(seats) > BulkBookingSerializer.MAX_SEATS:
+            raise serializers.ValidationError(f"At most {BulkBookingSerializer.MAX_SEATS} seats can be held at once")
+        return seats
+
+    def validate_minutes(self, minutes):
+        if minutes > settings.SEAT_HOLD_MAX_MINUTES:
+            raise serializers.ValidationError(f"Seats can be held for at most {settings.SEAT_HOLD_MAX_MINUTES} minutes")
+        return minutes
+
+
+class HoldConfirmSerializer(serializers.Serializer):
+    """The schedule whose holds to confirm, and optionally which of its seats."""
+    schedule = serializers.PrimaryKeyRelatedField(queryset=Schedule.objects.select_related('route', 'bus'))
+    seat_numbers = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
@@ -104,7 +216,7 @@ class LoginSerializer(serializers.Serializer):
         return attrs
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'is_staff']
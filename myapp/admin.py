@@ -1,9 +1,12 @@
 from django.contrib import admin
-from .models import Route, Bus, Schedule, Booking
+from .models import ArchivedBooking, ArchivedSchedule, OutboxMessage, Route, Bus, Schedule, Booking
 
 # Register your models here.
 admin.site.register(Route)
 admin.site.register(Bus)
 admin.site.register(Schedule)
 admin.site.register(Booking) 
+admin.site.register(ArchivedSchedule)
+admin.site.register(ArchivedBooking)
+admin.site.register(OutboxMessage)
 
@@ -0,0 +1,159 @@
+"""
+Occupancy and revenue analytics for the admin dashboard.
+
+OccupancyRollup keeps one row per departure day, route and bus. The
+booking services adjust the row in the same transaction as each booking
+change; catalog edits rebuild just the rows they touch (see signals), and
+the rebuild_analytics command recomputes any date range from the live and
+archived tables. Reports read only the rollups, so their cost depends on
+the date range asked for, not on how many bookings exist.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedBooking, ArchivedSchedule, Booking, OccupancyRollup, Schedule
+from .routers import use_primary
+
+ROLLUP_FIELDS = ('schedules', 'seats', 'confirmed', 'cancelled', 'revenue')
+
+# Report grouping -> rollup columns to group by; the first is the sort key.
+GROUPS = {
+    'day': ('day',),
+    'route': ('route', 'route__from_location', 'route__to_location'),
+    'bus': ('bus', 'bus__bus_number'),
+}
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _source_filters(prefix, since, until, route_id, bus_id):
+    lookups = {
+        f'{prefix}departure_time__gte': _start_of(since) if since else None,
+        f'{prefix}departure_time__lt': _start_of(until + timedelta(days=1)) if until else None,
+        f'{prefix}route_id': route_id,
+        f'{prefix}bus_id': bus_id,
+    }
+    return {k: v for k, v in lookups.items() if v is not None}
+
+
+def compute(since=None, until=None, route_id=None, bus_id=None):
+    """Rollup values from the live and archived tables, keyed by ``(day, route_id, bus_id)``."""
+    totals = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+    for schedules, bookings in ((Schedule, Booking), (ArchivedSchedule, ArchivedBooking)):
+        rows = (
+            schedules.objects.filter(**_source_filters('', since, until, route_id, bus_id))
+            .annotate(day=TruncDate('departure_time'))
+            .values('day', 'route', 'bus')
+            .annotate(schedule_count=Count('id'), seat_count=Sum('bus__total_seats'))
+            .order_by()
+        )
+        for row in rows:
+            entry = totals[(row['day'], row['route'], row['bus'])]
+            entry['schedules'] += row['schedule_count']
+            entry['seats'] += row['seat_count']
+
+        rows = (
+            bookings.objects.filter(**_source_filters('schedule__', since, until, route_id, bus_id))
+            .annotate(day=TruncDate('schedule__departure_time'))
+            .values('day', 'schedule__route', 'schedule__bus')
+            .annotate(
+                confirmed_count=Count('id', filter=Q(status='confirmed')),
+                cancelled_count=Count('id', filter=Q(status='cancelled')),
+                revenue_sum=Sum('schedule__price', filter=Q(status='confirmed')),
+            )
+            .order_by()
+        )
+        for row in rows:
+            entry = totals[(row['day'], row['schedule__route'], row['schedule__bus'])]
+            entry['confirmed'] += row['confirmed_count']
+            entry['cancelled'] += row['cancelled_count']
+            entry['revenue'] += row['revenue_sum'] or 0
+    return totals
+
+
+def rebuild(since=None, until=None, route_id=None, bus_id=None):
+    """Replace the rollup rows in scope with freshly computed ones; returns how many were written."""
+    # Rollups are written to the primary, so a lagging replica mustn't feed them.
+    with use_primary():
+        totals = compute(since, until, route_id, bus_id)
+    scope = {
+        'day__gte': since, 'day__lte': until, 'route_id': route_id, 'bus_id': bus_id,
+    }
+    with transaction.atomic():
+        OccupancyRollup.objects.filter(**{k: v for k, v in scope.items() if v is not None}).delete()
+        OccupancyRollup.objects.bulk_create(
+            (
+                OccupancyRollup(day=day, route_id=route, bus_id=bus, **values)
+                for (day, route, bus), values in totals.items()
+            ),
+            batch_size=1000,
+        )
+    return len(totals)
+
+
+def rebuild_schedule(schedule):
+    """Rebuild the one rollup row a schedule (live or archived) counts towards."""
+    day = timezone.localdate(schedule.departure_time)
+    rebuild(day, day, schedule.route_id, schedule.bus_id)
+
+
+def record_bookings(schedule, confirmed=0, cancelled=0):
+    """
+    Add ``confirmed``/``cancelled`` bookings (negative to remove) on a
+    schedule to its rollup row; call inside the booking's transaction. The
+    keywords match Booking statuses, so ``**{booking.status: 1}`` works.
+    """
+    if not (confirmed or cancelled):
+        return
+    if not isinstance(schedule, Schedule):
+        schedule = Schedule.objects.only('route', 'bus', 'departure_time', 'price').get(pk=schedule)
+    updated = OccupancyRollup.objects.filter(
+        day=timezone.localdate(schedule.departure_time), route_id=schedule.route_id, bus_id=schedule.bus_id,
+    ).update(
+        confirmed=F('confirmed') + confirmed,
+        cancelled=F('cancelled') + cancelled,
+        revenue=F('revenue') + schedule.price * confirmed,
+    )
+    if not updated:
+        # No row yet: build it from the tables, which already hold this change.
+        rebuild_schedule(schedule)
+
+
+def _summary(schedules, seats, confirmed, cancelled, revenue):
+    decided = confirmed + cancelled
+    return {
+        'schedules': schedules,
+        'seats': seats,
+        'confirmed': confirmed,
+        'cancelled': cancelled,
+        'revenue': revenue,
+        'load_factor': round(confirmed / seats, 4) if seats else None,
+        'cancellation_rate': round(cancelled / decided, 4) if decided else None,
+    }
+
+
+def report(queryset, group):
+    """Totals over ``queryset`` (rollup rows) and one summary per ``group`` value."""
+    sums = {f'total_{field}': Sum(field) for field in ROLLUP_FIELDS}
+    columns = GROUPS[group]
+
+    def summary(row):
+        return _summary(*(row[f'total_{field}'] or 0 for field in ROLLUP_FIELDS))
+
+    results = []
+    for row in queryset.values(*columns).annotate(**sums).order_by(columns[0]):
+        entry = {group: row[columns[0]]}
+        if group == 'route':
+            entry['label'] = f"{row['route__from_location']} → {row['route__to_location']}"
+        elif group == 'bus':
+            entry['label'] = row['bus__bus_number']
+        entry.update(summary(row))
+        results.append(entry)
+    return {'group': group, 'totals': summary(queryset.aggregate(**sums)), 'results': results}
@@ -0,0 +1,47 @@
+"""
+Move departed schedules and their bookings out of the live tables.
+
+Each batch is copied into ArchivedSchedule/ArchivedBooking and deleted
+from Schedule/Booking in one transaction, so a row is always in exactly
+one place and an interrupted run can simply be restarted.
+"""
+from django.db import transaction
+
+from .models import ArchivedBooking, ArchivedSchedule, Booking, Schedule
+
+SCHEDULE_FIELDS = ('id', 'route_id', 'bus_id', 'departure_time', 'price')
+BOOKING_FIELDS = ('id', 'user_id', 'schedule_id', 'seat_number', 'booked_at', 'status', 'cancelled_at')
+
+
+def departed(before):
+    return Schedule.objects.filter(departure_time__lt=before)
+
+
+def archive_departures(before, batch_size=500):
+    """
+    Archive schedules departing before ``before`` with their bookings,
+    ``batch_size`` schedules per transaction. Returns
+    ``(schedules, bookings)`` moved.
+    """
+    schedules = bookings = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                departed(before).order_by('departure_time', 'id').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return schedules, bookings
+
+            ArchivedSchedule.objects.bulk_create(
+                ArchivedSchedule(**row) for row in Schedule.objects.filter(pk__in=ids).values(*SCHEDULE_FIELDS)
+            )
+            moved = ArchivedBooking.objects.bulk_create(
+                (ArchivedBooking(**row) for row in Booking.objects.filter(schedule_id__in=ids).values(*BOOKING_FIELDS)),
+                batch_size=5000,
+            )
+            Booking.objects.filter(schedule_id__in=ids).delete()
+            # Cascades to seat holds and invalidates the schedule caches.
+            Schedule.objects.filter(pk__in=ids).delete()
+
+        schedules += len(ids)
+        bookings += len(moved)
@@ -0,0 +1,124 @@
+"""
+Async handlers for the hottest catalog reads: the schedule list, trip
+search and seat maps.
+
+DRF views are synchronous, so under ASGI each request to one still holds a
+thread until it finishes, including while it waits on the database. When
+SERVE_ASGI is on (ticketsystemproject/asgi.py turns it on), myapp.urls
+routes GET requests for these endpoints here instead. Cached responses are
+served without leaving the event loop and misses read through Django's
+async ORM. The JSON, cursors and ETags are the same as the DRF views', and
+both share the catalog response cache. Other methods, such as POST to
+/schedules/, fall through to the DRF views.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+
+from .Serializers import ScheduleSerializer
+from .authentication import CachedTokenAuthentication
+from .cache import acached_response
+from .filters import filter_schedules, search_schedules
+from .models import Schedule
+from .pagination import StableCursorPagination
+from .seatmap import SeatMap
+from .throttling import SeatMapThrottle, buckets
+from .views import ScheduleViewSet
+
+
+async def authenticate(request):
+    """The token's user, as DRF would authenticate it, or AnonymousUser."""
+    if not request.headers.get('Authorization'):
+        return AnonymousUser()
+    result = await sync_to_async(CachedTokenAuthentication().authenticate)(request)
+    return result[0] if result else AnonymousUser()
+
+
+async def check_throttle(request, user, throttle):
+    """Raise Throttled as the DRF view would; in-memory buckets are checked without leaving the event loop."""
+    request.user = user
+    if buckets(throttle.scope).shared:
+        allowed = await sync_to_async(throttle.allow_request)(request, None)
+    else:
+        allowed = throttle.allow_request(request, None)
+    if not allowed:
+        raise exceptions.Throttled(throttle.wait())
+
+
+def read_view(view, fallback):
+    """
+    Serve GET and HEAD with the coroutine ``view`` and everything else with
+    the sync DRF view ``fallback``. DRF errors raised by ``view`` get the
+    status and JSON body DRF would have sent.
+    """
+    fallback = sync_to_async(fallback)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await fallback(request, *args, **kwargs)
+        try:
+            return await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+            response = JsonResponse(detail, status=exc.status_code)
+            if isinstance(exc, exceptions.AuthenticationFailed):
+                response['WWW-Authenticate'] = CachedTokenAuthentication.keyword
+            if getattr(exc, 'wait', None):
+                response['Retry-After'] = '%d' % exc.wait
+            return response
+
+    # ATOMIC_REQUESTS can't wrap a coroutine; the DRF views open their own
+    # transactions for writes.
+    return csrf_exempt(transaction.non_atomic_requests(wrapper))
+
+
+async def _schedule_page(request, queryset):
+    drf_request = Request(request)
+    paginator = StableCursorPagination()
+    page = await paginator.apaginate_queryset(queryset, drf_request, view=ScheduleViewSet)
+    serializer = ScheduleSerializer(page, many=True, context={'request': drf_request})
+    return paginator.get_paginated_response(serializer.data).data
+
+
+async def _list_schedules(request):
+    await authenticate(request)
+
+    async def build():
+        queryset = filter_schedules(Schedule.objects.select_related('route', 'bus'), request.GET)
+        return await _schedule_page(request, queryset)
+    return await acached_response(request, ScheduleViewSet.cache_resources, build)
+
+
+async def _search_schedules(request):
+    await authenticate(request)
+
+    async def build():
+        queryset = search_schedules(Schedule.objects.select_related('route', 'bus'), request.GET)
+        return await _schedule_page(request, queryset)
+    return await acached_response(request, ScheduleViewSet.cache_resources, build)
+
+
+async def _available_seats(request, pk):
+    user = await authenticate(request)
+    await check_throttle(request, user, SeatMapThrottle())
+    encoding = request.GET.get('encoding', 'list')
+    if encoding not in SeatMap.ENCODINGS:
+        return JsonResponse({"error": f"encoding must be one of {', '.join(SeatMap.ENCODINGS)}"}, status=400)
+    try:
+        schedule = await Schedule.objects.select_related('bus').aget(pk=pk)
+    except Schedule.DoesNotExist:
+        raise exceptions.NotFound("No Schedule matches the given query.")
+    unavailable = [seat async for seat in SeatMap.unavailable_seats(schedule, user)]
+    return JsonResponse(SeatMap(schedule.bus.total_seats, unavailable).as_response(encoding))
+
+
+schedule_list = read_view(_list_schedules, ScheduleViewSet.as_view({'get': 'list', 'post': 'create'}))
+schedule_search = read_view(_search_schedules, ScheduleViewSet.as_view({'get': 'search'}))
+available_seats = read_view(_available_seats, ScheduleViewSet.as_view({'get': 'available_seats'}))
@@ -0,0 +1,94 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def _cache_key(key):
+    # Don't put raw tokens into a shared cache.
+    return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def forget_token(key):
+    cache.delete(_cache_key(key))
+
+
+def forget_user_tokens(user):
+    for key in Token.objects.filter(user=user).values_list('key', flat=True):
+        forget_token(key)
+
+
+def token_expired(created):
+    ttl = settings.AUTH_TOKEN_TTL
+    return ttl is not None and created + timedelta(seconds=ttl) <= timezone.now()
+
+
+def issue_token(user):
+    """
+    The user's token, created if they have none (e.g. after logging out),
+    with a single INSERT ... ON CONFLICT where the database supports it
+    rather than get_or_create's SELECT, savepoint and INSERT. An expired
+    token is replaced by the same statement.
+    """
+    alias = router.db_for_write(Token)
+    connection = connections[alias]
+    now = timezone.now()
+    if not connection.features.can_return_columns_from_insert:
+        token, _ = Token.objects.get_or_create(user=user)
+        if token_expired(token.created):
+            Token.objects.filter(key=token.key).delete()
+            token = Token.objects.create(user=user)
+    else:
+        quote = connection.ops.quote_name
+        table = quote(Token._meta.db_table)
+        key, created = quote('key'), quote('created')
+        ttl = settings.AUTH_TOKEN_TTL
+        # Tokens created at or before the cutoff are expired; without a TTL
+        # the update is a no-op that makes the statement return the existing row.
+        cutoff = now - timedelta(seconds=ttl) if ttl is not None else None
+        token = Token.objects.raw(
+            f'INSERT INTO {table} ({key}, {quote("user_id")}, {created}) '
+            f'VALUES (%s, %s, %s) ON CONFLICT ({quote("user_id")}) DO UPDATE SET '
+            f'{key} = CASE WHEN {table}.{created} <= %s THEN EXCLUDED.{key} ELSE {table}.{key} END, '
+            f'{created} = CASE WHEN {table}.{created} <= %s THEN EXCLUDED.{created} ELSE {table}.{created} END '
+            f'RETURNING *',
+            [Token.generate_key(), user.pk, now, cutoff, cutoff],
+            using=alias,
+        )[0]
+    token.user = user
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers token -> user for a short while, so
+    authenticated requests skip the Token/User join. Entries are dropped
+    when the token is deleted or the user is saved (see signals), and
+    tokens older than AUTH_TOKEN_TTL seconds are rejected.
+    """
+
+    def authenticate_credentials(self, key):
+        entry = cache.get(_cache_key(key))
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            entry = (user, token.created)
+            timeout = settings.AUTH_TOKEN_CACHE_TIMEOUT
+            if settings.AUTH_TOKEN_TTL is not None:
+                remaining = (token.created + timedelta(seconds=settings.AUTH_TOKEN_TTL) - timezone.now()).total_seconds()
+                timeout = max(0, min(timeout, int(remaining)))
+            if timeout:
+                cache.set(_cache_key(key), entry, timeout)
+
+        user, created = entry
+        if token_expired(created):
+            Token.objects.filter(key=key).delete()
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return user, Token(key=key, user=user, created=created)
@@ -0,0 +1,276 @@
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import Client, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .models import Booking, Bus, Route, Schedule
+from .services import expected_available_seats
+
+TOWNS = [
+    'Dar es Salaam', 'Morogoro', 'Dodoma', 'Iringa', 'Mbeya', 'Arusha', 'Moshi', 'Tanga',
+    'Mwanza', 'Tabora', 'Kigoma', 'Songea', 'Mtwara', 'Lindi', 'Singida', 'Shinyanga',
+]
+
+
+def seed_catalog(schedules, days=365, batch_size=5000, seed=0):
+    """
+    Bulk-insert a route for every town pair and a small fleet (reusing them
+    if an earlier run created them), then ``schedules`` departures spread
+    over the next ``days`` days. Returns the routes used.
+    """
+    rng = random.Random(seed)
+    routes = list(Route.objects.filter(from_location__in=TOWNS, to_location__in=TOWNS))
+    if not routes:
+        routes = Route.objects.bulk_create(
+            Route(from_location=a, to_location=b, distance=rng.randint(80, 1200))
+            for a in TOWNS for b in TOWNS if a != b
+        )
+    buses = list(Bus.objects.filter(bus_number__startswith='BENCH-'))
+    if not buses:
+        buses = Bus.objects.bulk_create(
+            Bus(bus_number=f'BENCH-{i:03d}', bus_name='Bench Coach', total_seats=rng.choice([32, 40, 48, 60]))
+            for i in range(50)
+        )
+
+    start = timezone.now()
+    for batch in _batches(range(schedules), batch_size):
+        rows = []
+        for _ in batch:
+            bus = rng.choice(buses)
+            rows.append(Schedule(
+                route=rng.choice(routes),
+                bus=bus,
+                departure_time=start + timedelta(minutes=rng.randint(0, days * 24 * 60)),
+                price=rng.randrange(10000, 80000, 500),
+                available_seats=bus.total_seats,
+            ))
+        Schedule.objects.bulk_create(rows)
+    return routes
+
+
+def seed_users(count, password, prefix='loadtest', batch_size=5000):
+    """Bulk-insert ``count`` users sharing one password, hashed once."""
+    hashed = make_password(password)
+    existing = set(User.objects.filter(username__startswith=f'{prefix}_').values_list('username', flat=True))
+    names = [f'{prefix}_{i}' for i in range(count)]
+    for batch in _batches([n for n in names if n not in existing], batch_size):
+        User.objects.bulk_create(User(username=name, password=hashed) for name in batch)
+    return list(User.objects.filter(username__in=names).values_list('pk', flat=True))
+
+
+def seed_bookings(bookings, user_ids, fill=0.6, cancelled_ratio=0.1, batch_size=10000, seed=0):
+    """
+    Bulk-insert about ``bookings`` bookings, filling schedules up to ``fill``
+    of their seats, then rebuild the seat counters in one UPDATE.
+    """
+    rng = random.Random(seed)
+    created = 0
+    rows = []
+    schedules = (
+        Schedule.objects.filter(booking__isnull=True)
+        .values_list('pk', 'bus__total_seats')
+        .iterator(chunk_size=batch_size)
+    )
+    for schedule_id, total_seats in schedules:
+        if created >= bookings:
+            break
+        count = min(bookings - created, rng.randint(0, int(total_seats * fill)))
+        for seat in rng.sample(range(1, total_seats + 1), count):
+            rows.append(Booking(
+                user_id=rng.choice(user_ids),
+                schedule_id=schedule_id,
+                seat_number=seat,
+                status='cancelled' if rng.random() < cancelled_ratio else 'confirmed',
+            ))
+        created += count
+        if len(rows) >= batch_size:
+            Booking.objects.bulk_create(rows)
+            rows = []
+    if rows:
+        Booking.objects.bulk_create(rows)
+    Schedule.objects.update(available_seats=expected_available_seats())
+    return created
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def timed(fn, runs):
+    """Call ``fn`` ``runs`` times and return the latencies in milliseconds."""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def login_samples(username, password, runs):
+    """
+    Latencies of ``runs`` in-process POST /api/login/ calls. The token is
+    deleted before each one, as a logout would, so every login issues one.
+    Login throttles are off, since they would stop the run after a few logins.
+    """
+    client = Client()
+    body = {'username': username, 'password': password}
+    samples = []
+    with override_settings(THROTTLE_RATES={}):
+        for _ in range(runs):
+            Token.objects.filter(user__username=username).delete()
+            started = time.perf_counter()
+            response = client.post('/api/login/', body, content_type='application/json')
+            samples.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f"Login as {username} failed with {response.status_code}: {response.content[:200]!r}")
+    return samples
+
+
+def _login_rate(args):
+    started = time.perf_counter()
+    runs = len(login_samples(*args))
+    return runs / (time.perf_counter() - started)
+
+
+def parallel_login_rate(usernames, password, runs):
+    """Logins per second with one process per user in ``usernames``, each logging in ``runs`` times."""
+    # Forked workers must not share the parent's database connections.
+    connections.close_all()
+    with ProcessPoolExecutor(len(usernames), initializer=django.setup) as pool:
+        return sum(pool.map(_login_rate, [(username, password, runs) for username in usernames]))
+
+
+def summarize(samples):
+    """p50/p95/p99 and mean of a list of millisecond latencies."""
+    if len(samples) < 2:
+        value = samples[0] if samples else 0.0
+        return {'p50': value, 'p95': value, 'p99': value, 'mean': value}
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {'p50': cuts[49], 'p95': cuts[94], 'p99': cuts[98], 'mean': statistics.fmean(samples)}
+
+
+def format_summary(label, summary):
+    return (
+        f"{label:<28} p50 {summary['p50']:8.2f} ms  p95 {summary['p95']:8.2f} ms  "
+        f"p99 {summary['p99']:8.2f} ms  mean {summary['mean']:8.2f} ms"
+    )
+
+
+class HttpClient:
+    """A tiny JSON client over urllib, so load tests need no extra packages."""
+
+    def __init__(self, base_url, token=None, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def request(self, method, path, data=None):
+        """Return ``(status, parsed body, latency in ms)``; HTTP errors are not raised."""
+        headers = {'Accept': 'application/json'}
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                status, payload = response.status, response.read()
+        except urllib.error.HTTPError as error:
+            status, payload = error.code, error.read()
+        except (urllib.error.URLError, TimeoutError):
+            # Connection refused/reset or timed out; counted as an error.
+            status, payload = 0, b''
+        elapsed = (time.perf_counter() - started) * 1000
+        try:
+            parsed = json.loads(payload) if payload else None
+        except ValueError:
+            parsed = None
+        return status, parsed, elapsed
+
+
+class LoadTest:
+    """
+    Run scenarios against a live server from ``concurrency`` threads and
+    collect per-operation latencies, status codes and throughput.
+
+    A scenario is ``fn(rng) -> [(operation, status, ms), ...]``; one call
+    may issue several requests (e.g. book then cancel).
+    """
+
+    def __init__(self, concurrency=8, seed=0):
+        self.concurrency = concurrency
+        self.seed = seed
+
+    def run(self, scenario, iterations):
+        results = defaultdict(lambda: {'samples': [], 'statuses': Counter()})
+        lock = threading.Lock()
+        per_worker = [iterations // self.concurrency + (i < iterations % self.concurrency) for i in range(self.concurrency)]
+
+        def worker(index):
+            rng = random.Random(self.seed * 1000 + index)
+            local = []
+            for _ in range(per_worker[index]):
+                local.extend(scenario(rng))
+            with lock:
+                for operation, status, elapsed in local:
+                    results[operation]['samples'].append(elapsed)
+                    results[operation]['statuses'][status] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            list(pool.map(worker, range(self.concurrency)))
+        wall = time.perf_counter() - started
+
+        report = {}
+        for operation, result in results.items():
+            samples = result['samples']
+            report[operation] = {
+                **summarize(samples),
+                'requests': len(samples),
+                'throughput': len(samples) / wall if wall else 0.0,
+                'errors': sum(hits for status, hits in result['statuses'].items() if status >= 500 or status == 0),
+                'statuses': {str(status): hits for status, hits in sorted(result['statuses'].items())},
+            }
+        return report
+
+
+def compare(report, baseline, tolerance=0.2):
+    """
+    List regressions of ``report`` against ``baseline``: p95 more than
+    ``tolerance`` slower, throughput more than ``tolerance`` lower, or
+    new server errors.
+    """
+    regressions = []
+    for operation, current in sorted(report.items()):
+        previous = baseline.get(operation)
+        if previous is None:
+            continue
+        if current['p95'] > previous['p95'] * (1 + tolerance):
+            regressions.append(f"{operation}: p95 {previous['p95']:.2f} -> {current['p95']:.2f} ms")
+        if current['throughput'] < previous['throughput'] * (1 - tolerance):
+            regressions.append(
+                f"{operation}: throughput {previous['throughput']:.1f} -> {current['throughput']:.1f} req/s"
+            )
+        if current['errors'] > previous.get('errors', 0):
+            regressions.append(f"{operation}: {current['errors']} server errors (baseline {previous.get('errors', 0)})")
+    return regressions
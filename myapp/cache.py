@@ -0,0 +1,126 @@
+"""
+Response cache for the read-mostly catalog (routes, buses, schedules).
+
+Every resource has a generation number in the cache. Cached responses are
+keyed by the generations they depend on, so bumping a generation on write
+invalidates all of them at once without tracking individual keys. Locally
+this uses the in-process cache; set CACHE_URL so all workers share one.
+
+Entries are built from the primary database, never a read replica: a
+lagging replica would otherwise be cached under the new generation and
+served to everyone, including the client that just wrote, until it expires.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.response import Response
+
+from .routers import use_primary
+
+RESOURCES = ('routes', 'buses', 'schedules')
+
+
+def _generation_key(resource):
+    return f'catalog:generation:{resource}'
+
+
+def generation(resource):
+    # Seed with the clock so a generation lost to eviction never repeats.
+    return cache.get_or_set(_generation_key(resource), time.time_ns)
+
+
+def _bump(resources):
+    for resource in resources:
+        try:
+            cache.incr(_generation_key(resource))
+        except ValueError:
+            cache.set(_generation_key(resource), time.time_ns())
+
+
+def invalidate(*resources):
+    """
+    Invalidate cached responses for ``resources`` now and again on commit,
+    so a read racing the write can't re-cache the old rows for long.
+    """
+    _bump(resources)
+    transaction.on_commit(lambda: _bump(resources))
+
+
+def _etag(data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    return quote_etag(hashlib.md5(payload, usedforsecurity=False).hexdigest())
+
+
+def _response_key(request, generations):
+    return 'catalog:response:' + hashlib.md5(
+        f"{':'.join(map(str, generations))}|{request.build_absolute_uri()}".encode(), usedforsecurity=False
+    ).hexdigest()
+
+
+def _not_modified(request, entry):
+    if_none_match = request.headers.get('If-None-Match')
+    return bool(if_none_match) and entry['etag'] in parse_etags(if_none_match)
+
+
+def cached_response(request, resources, build):
+    """
+    Serve ``build()``'s data from the cache when the generations of
+    ``resources`` haven't moved, answering ``If-None-Match`` with a 304.
+    """
+    key = _response_key(request, [generation(resource) for resource in resources])
+
+    entry = cache.get(key)
+    if entry is None:
+        with use_primary():
+            response = build()
+        if response.status_code != 200:
+            return response
+        entry = {'data': response.data, 'etag': _etag(response.data)}
+        cache.set(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+
+    headers = {'ETag': entry['etag']}
+    if _not_modified(request, entry):
+        return Response(status=304, headers=headers)
+    return Response(entry['data'], headers=headers)
+
+
+async def acached_response(request, resources, abuild):
+    """
+    ``cached_response`` for async views, sharing its cache entries:
+    ``abuild()`` returns the response data and errors are raised.
+    """
+    key = _response_key(
+        request, [await cache.aget_or_set(_generation_key(resource), time.time_ns) for resource in resources]
+    )
+
+    entry = await cache.aget(key)
+    if entry is None:
+        with use_primary():
+            data = await abuild()
+        entry = {'data': data, 'etag': _etag(data)}
+        await cache.aset(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+
+    headers = {'ETag': entry['etag']}
+    if _not_modified(request, entry):
+        return HttpResponseNotModified(headers=headers)
+    return JsonResponse(entry['data'], encoder=DjangoJSONEncoder, headers=headers)
+
+
+class CatalogCacheMixin:
+    """Cache ``list`` and ``retrieve`` of a catalog viewset."""
+    cache_resources = ()
+
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        return cached_response(request, self.cache_resources, lambda: build(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        build = super().retrieve
+        return cached_response(request, self.cache_resources, lambda: build(request, *args, **kwargs))
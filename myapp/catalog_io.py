@@ -0,0 +1,315 @@
+"""
+Streaming CSV / JSON Lines import and export of the timetable catalog.
+
+Rows are matched on natural keys so an export can be edited and imported
+back: routes on (from_location, to_location), buses on bus_number and
+schedules on (bus_number, departure_time). Existing rows are updated,
+new ones inserted, one chunk at a time with bulk queries.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import analytics, cache
+from .models import Bus, Route, Schedule
+from .services import expected_available_seats
+
+FORMATS = ('csv', 'jsonl')
+
+FIELDS = {
+    'routes': ['from_location', 'to_location', 'distance'],
+    'buses': ['bus_number', 'bus_name', 'total_seats'],
+    'schedules': ['from_location', 'to_location', 'bus_number', 'departure_time', 'price'],
+}
+
+
+class CatalogImportError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid row(s)")
+
+
+def guess_format(filename, default='csv'):
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_records(stream, file_format):
+    """Yield ``(line_number, dict)`` pairs from a text stream."""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, None
+
+
+def _text(value, max_length):
+    value = str(value if value is not None else '').strip()
+    if not value or len(value) > max_length:
+        raise ValueError
+    return value
+
+
+def _datetime(value):
+    parsed = parse_datetime(str(value).strip())
+    if parsed is None:
+        raise ValueError
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def _price(value):
+    price = Decimal(str(value).strip())
+    if price < 0 or price.as_tuple().exponent < -2:
+        raise ValueError
+    return price
+
+
+def _positive_int(value):
+    number = int(str(value).strip())
+    if number < 1:
+        raise ValueError
+    return number
+
+
+PARSERS = {
+    'from_location': lambda v: _text(v, 100),
+    'to_location': lambda v: _text(v, 100),
+    'distance': lambda v: float(str(v).strip()),
+    'bus_number': lambda v: _text(v, 50),
+    'bus_name': lambda v: _text(v, 100),
+    'total_seats': _positive_int,
+    'departure_time': _datetime,
+    'price': _price,
+}
+
+
+def _parse(kind, line_number, record, errors):
+    if not isinstance(record, dict):
+        errors.append({'line': line_number, 'error': "Not a JSON object"})
+        return None
+    row = {}
+    for field in FIELDS[kind]:
+        try:
+            row[field] = PARSERS[field](record.get(field))
+        except (TypeError, ValueError, InvalidOperation):
+            errors.append({'line': line_number, 'field': field, 'error': f"Invalid value: {record.get(field)!r}"})
+            return None
+    return row
+
+
+def _upsert_routes(rows, errors):
+    keys = {(r['from_location'], r['to_location']) for _, r in rows}
+    existing = {
+        (route.from_location, route.to_location): route
+        for route in Route.objects.filter(
+            from_location__in={k[0] for k in keys}, to_location__in={k[1] for k in keys}
+        )
+    }
+    new, changed = {}, {}
+    for _, row in rows:
+        key = (row['from_location'], row['to_location'])
+        route = existing.get(key)
+        if route is None:
+            new[key] = Route(**row)
+        else:
+            route.distance = row['distance']
+            route.updated_at = timezone.now()
+            changed[key] = route
+    Route.objects.bulk_create(new.values())
+    Route.objects.bulk_update(changed.values(), ['distance', 'updated_at'])
+    return len(new), len(changed)
+
+
+def _upsert_buses(rows, errors):
+    existing = {bus.bus_number: bus for bus in Bus.objects.filter(bus_number__in={r['bus_number'] for _, r in rows})}
+    new, changed = {}, {}
+    for _, row in rows:
+        bus = existing.get(row['bus_number'])
+        if bus is None:
+            new[row['bus_number']] = Bus(**row)
+        else:
+            bus.bus_name = row['bus_name']
+            bus.total_seats = row['total_seats']
+            bus.updated_at = timezone.now()
+            changed[bus.bus_number] = bus
+    Bus.objects.bulk_create(new.values())
+    Bus.objects.bulk_update(changed.values(), ['bus_name', 'total_seats', 'updated_at'])
+    if changed:
+        # Capacity may have changed, so refresh the seat counters.
+        Schedule.objects.filter(bus__in=changed.values()).update(
+            available_seats=expected_available_seats(), updated_at=timezone.now()
+        )
+    return len(new), len(changed)
+
+
+def _upsert_schedules(rows, errors):
+    route_keys = {(r['from_location'], r['to_location']) for _, r in rows}
+    routes = {
+        (route.from_location, route.to_location): route
+        for route in Route.objects.filter(
+            from_location__in={k[0] for k in route_keys}, to_location__in={k[1] for k in route_keys}
+        )
+    }
+    buses = {bus.bus_number: bus for bus in Bus.objects.filter(bus_number__in={r['bus_number'] for _, r in rows})}
+    existing = {
+        (schedule.bus_id, schedule.departure_time): schedule
+        for schedule in Schedule.objects.filter(
+            bus__in=buses.values(), departure_time__in={r['departure_time'] for _, r in rows}
+        )
+    }
+
+    new, changed = {}, {}
+    for line_number, row in rows:
+        route = routes.get((row['from_location'], row['to_location']))
+        bus = buses.get(row['bus_number'])
+        if route is None or bus is None:
+            missing = 'route' if route is None else 'bus'
+            errors.append({'line': line_number, 'field': missing, 'error': f"Unknown {missing}"})
+            continue
+        key = (bus.pk, row['departure_time'])
+        schedule = existing.get(key)
+        if schedule is None:
+            new[key] = Schedule(
+                route=route, bus=bus, departure_time=row['departure_time'],
+                price=row['price'], available_seats=bus.total_seats,
+            )
+        else:
+            schedule.route = route
+            schedule.price = row['price']
+            schedule.updated_at = timezone.now()
+            changed[key] = schedule
+    if not errors:
+        Schedule.objects.bulk_create(new.values())
+        Schedule.objects.bulk_update(changed.values(), ['route', 'price', 'updated_at'])
+    return len(new), len(changed)
+
+
+UPSERTS = {
+    'routes': _upsert_routes,
+    'buses': _upsert_buses,
+    'schedules': _upsert_schedules,
+}
+
+
+def import_catalog(kind, stream, file_format, chunk_size=1000, dry_run=False):
+    """
+    Import ``kind`` rows from a text stream, ``chunk_size`` rows per bulk
+    write. All or nothing: any invalid row raises CatalogImportError and
+    rolls the whole import back. Returns ``{'created': n, 'updated': n}``.
+    """
+    errors = []
+    totals = {'created': 0, 'updated': 0}
+    departures = []
+    records = read_records(stream, file_format)
+    with transaction.atomic():
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            rows = [(n, row) for n, record in chunk if (row := _parse(kind, n, record, errors)) is not None]
+            if errors:
+                # Keep parsing to report every bad row, but stop writing.
+                continue
+            created, updated = UPSERTS[kind](rows, errors)
+            if kind == 'schedules':
+                departures.extend(row['departure_time'] for _, row in rows)
+            totals['created'] += created
+            totals['updated'] += updated
+        if errors:
+            raise CatalogImportError(errors)
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            # Bulk writes skip model signals, so invalidate and refresh the
+            # analytics rollups explicitly.
+            cache.invalidate(*cache.RESOURCES)
+            if kind == 'buses' and totals['updated']:
+                analytics.rebuild()
+            elif departures:
+                analytics.rebuild(timezone.localdate(min(departures)), timezone.localdate(max(departures)))
+    return totals
+
+
+def export_queryset(kind):
+    if kind == 'routes':
+        return Route.objects.order_by('id').values(*FIELDS['routes'])
+    if kind == 'buses':
+        return Bus.objects.order_by('id').values(*FIELDS['buses'])
+    return Schedule.objects.order_by('departure_time', 'id').values(
+        'departure_time', 'price',
+        from_location=F('route__from_location'),
+        to_location=F('route__to_location'),
+        bus_number=F('bus__bus_number'),
+    )
+
+
+def _encoder(fields, file_format):
+    """``(header, encode)``: the text before the first row, and a row -> text function."""
+    if file_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields)
+        writer.writeheader()
+        header = buffer.getvalue()
+
+        def encode(row):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(_serializable(row))
+            return buffer.getvalue()
+        return header, encode
+
+    def encode(row):
+        row = _serializable(row)
+        return json.dumps({field: row[field] for field in fields}) + "\n"
+    return '', encode
+
+
+def export_catalog(kind, file_format, chunk_size=2000):
+    """Yield the table as CSV or JSON Lines text, streaming from the database in ~64 KB pieces."""
+    header, encode = _encoder(FIELDS[kind], file_format)
+    parts, size = [header], len(header)
+    for row in export_queryset(kind).iterator(chunk_size=chunk_size):
+        parts.append(encode(row))
+        size += len(parts[-1])
+        if size > 64 * 1024:
+            yield ''.join(parts)
+            parts, size = [], 0
+    yield ''.join(parts)
+
+
+async def aexport_catalog(kind, file_format, chunk_size=2000):
+    """export_catalog for ASGI, where a sync iterator would be read into memory before sending."""
+    header, encode = _encoder(FIELDS[kind], file_format)
+    parts, size = [header], len(header)
+    async for row in export_queryset(kind).aiterator(chunk_size=chunk_size):
+        parts.append(encode(row))
+        size += len(parts[-1])
+        if size > 64 * 1024:
+            yield ''.join(parts)
+            parts, size = [], 0
+    yield ''.join(parts)
+
+
+def _serializable(row):
+    for key, value in row.items():
+        if isinstance(value, Decimal):
+            row[key] = str(value)
+        elif hasattr(value, 'isoformat'):
+            row[key] = value.isoformat()
+    return row
@@ -0,0 +1,76 @@
+"""
+Everything the admin dashboard shows, in one normalized response.
+
+Each entity is a map of id -> row that refers to other entities by id, so a
+route, bus or user is sent once rather than nested into every schedule and
+booking, and rows are read with ``values()`` instead of serializers. With
+``since`` only rows changed after that time are sent, plus the ids deleted
+since then. Bookings of a deleted schedule or user are not listed
+separately; clients drop them with their parent.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Q
+
+from .models import Booking, Bus, Route, Schedule, Tombstone
+
+# name -> (model, fields, "changed at" columns); bookings are paged by the view.
+ENTITIES = {
+    'routes': (Route, ('id', 'from_location', 'to_location', 'distance'), ('updated_at',)),
+    'buses': (Bus, ('id', 'bus_number', 'bus_name', 'total_seats'), ('updated_at',)),
+    'schedules': (Schedule, ('id', 'route', 'bus', 'departure_time', 'price', 'available_seats'), ('updated_at',)),
+    # Users only carry what the booking form needs. New users appear in deltas
+    # by date_joined, edited ones by their UserChange (see myapp.signals).
+    'users': (User, ('id', 'username', 'is_staff'), ('date_joined', 'dashboard_change__updated_at')),
+}
+BOOKING_FIELDS = ('id', 'user', 'schedule', 'seat_number', 'status', 'booked_at', 'cancelled_at')
+
+# A write that commits just after a delta was read can carry an earlier
+# timestamp; re-sending a short overlap picks it up on the next refresh.
+OVERLAP = timedelta(seconds=60)
+
+
+def record_deletion(kind, ids):
+    Tombstone.objects.bulk_create(Tombstone(kind=kind, object_id=pk) for pk in ids)
+
+
+def retention():
+    return timedelta(days=settings.DASHBOARD_DELTA_DAYS)
+
+
+def is_delta(since, now):
+    """Deltas are only possible while the tombstones since then are kept."""
+    return since is not None and since > now - retention()
+
+
+def entity_maps(since=None):
+    changed = {}
+    for name, (model, fields, columns) in ENTITIES.items():
+        queryset = model.objects.all()
+        if since is not None:
+            changed_after = Q()
+            for column in columns:
+                changed_after |= Q(**{f'{column}__gt': since - OVERLAP})
+            queryset = queryset.filter(changed_after)
+        changed[name] = {row['id']: row for row in queryset.order_by('id').values(*fields)}
+    return changed
+
+
+def changed_bookings(since):
+    return {
+        row['id']: row
+        for row in Booking.objects.filter(updated_at__gt=since - OVERLAP).order_by('id').values(*BOOKING_FIELDS)
+    }
+
+
+def deletions(since):
+    deleted = {name: [] for name in (*ENTITIES, 'bookings')}
+    for kind, object_id in Tombstone.objects.filter(deleted_at__gt=since - OVERLAP).values_list('kind', 'object_id'):
+        deleted[kind].append(object_id)
+    return deleted
+
+
+def purge_tombstones(now):
+    Tombstone.objects.filter(deleted_at__lte=now - retention()).delete()
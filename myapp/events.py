@@ -0,0 +1,101 @@
+"""
+Seat availability events, published when bookings change and streamed to
+seat pickers as server-sent events.
+
+The default broker fans out inside one process, which is enough for a
+single ASGI worker. SEAT_EVENTS_BROKER can name another class with the
+same ``publish`` / ``subscribe`` interface (e.g. one backed by Redis
+pub/sub) so events reach subscribers in every worker.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+SEAT_TAKEN = 'seat-taken'
+SEAT_RELEASED = 'seat-released'
+SEAT_HELD = 'seat-held'
+RESYNC = 'resync'
+
+
+class Subscription:
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def offer(self, message):
+        """Queue a message; runs on the subscriber's event loop."""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # A consumer this far behind should refetch the seat map.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': RESYNC})
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Thread-safe fan-out from sync publishers to asyncio subscribers."""
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.maxsize)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscriptions.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                # The subscriber's loop has shut down.
+                self.unsubscribe(subscription)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.SEAT_EVENTS_BROKER)()
+    return _broker
+
+
+def schedule_channel(schedule_id):
+    return f'schedule:{schedule_id}:seats'
+
+
+def publish_seats(schedule_id, event_type, seats):
+    """Announce seat changes once the surrounding transaction commits."""
+    message = {'type': event_type, 'schedule': schedule_id, 'seats': sorted(seats)}
+    transaction.on_commit(lambda: get_broker().publish(schedule_channel(schedule_id), message))
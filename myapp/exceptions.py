@@ -0,0 +1,12 @@
+from rest_framework.exceptions import APIException
+
+
+class SeatUnavailable(APIException):
+    status_code = 409
+    default_detail = "Seat is already booked."
+    default_code = 'seat_unavailable'
+
+    def __init__(self, seat_number=None, detail=None):
+        if detail is None and seat_number is not None:
+            detail = f"Seat {seat_number} is already booked"
+        super().__init__(detail)
@@ -0,0 +1,101 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers
+
+from .models import Booking
+
+
+def _param(params, name, parse):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        parsed = parse(value)
+    except (TypeError, ValueError, InvalidOperation):
+        parsed = None
+    if parsed is None:
+        raise serializers.ValidationError({name: f"Invalid value: {value!r}"})
+    return parsed
+
+
+def _datetime(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            return None
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def search_schedules(queryset, params):
+    """
+    Apply ``?from=&to=&date=`` for the trip search: upcoming departures on
+    the route with seats left. Matches are exact so the route index is used.
+    """
+    origin = (params.get('from') or '').strip()
+    destination = (params.get('to') or '').strip()
+    if not origin or not destination:
+        raise serializers.ValidationError({"detail": "Both 'from' and 'to' are required."})
+
+    now = timezone.now()
+    queryset = queryset.filter(
+        route__from_location=origin,
+        route__to_location=destination,
+        departure_time__gte=now,
+        available_seats__gt=0,
+    )
+    day = _param(params, 'date', parse_date)
+    if day is not None:
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        queryset = queryset.filter(departure_time__gte=max(start, now), departure_time__lt=start + timedelta(days=1))
+    return queryset
+
+
+def filter_schedules(queryset, params):
+    """Apply ``?route=&bus=&departure_after=&departure_before=&min_price=&max_price=``."""
+    lookups = {
+        'route_id': _param(params, 'route', int),
+        'bus_id': _param(params, 'bus', int),
+        'departure_time__gte': _param(params, 'departure_after', _datetime),
+        'departure_time__lt': _param(params, 'departure_before', _datetime),
+        'price__gte': _param(params, 'min_price', Decimal),
+        'price__lte': _param(params, 'max_price', Decimal),
+    }
+    return queryset.filter(**{k: v for k, v in lookups.items() if v is not None})
+
+
+def filter_bookings(queryset, params, allow_user=False):
+    """Apply ``?status=&schedule=`` and, for staff, ``?user=``."""
+    statuses = [value for value, _ in Booking.BOOKING_STATUS_CHOICES]
+    status = params.get('status')
+    if status and status not in statuses:
+        raise serializers.ValidationError({'status': f"Must be one of {', '.join(statuses)}"})
+    lookups = {
+        'status': status or None,
+        'schedule_id': _param(params, 'schedule', int),
+        'user_id': _param(params, 'user', int) if allow_user else None,
+    }
+    return queryset.filter(**{k: v for k, v in lookups.items() if v is not None})
+
+
+def filter_rollups(queryset, params):
+    """Apply ``?from=&to=&route=&bus=``; ``from`` defaults to 30 days ago."""
+    since = _param(params, 'from', parse_date) or timezone.localdate() - timedelta(days=30)
+    lookups = {
+        'day__gte': since,
+        'day__lte': _param(params, 'to', parse_date),
+        'route_id': _param(params, 'route', int),
+        'bus_id': _param(params, 'bus', int),
+    }
+    return queryset.filter(**{k: v for k, v in lookups.items() if v is not None})
+
+
+def changed_since(params):
+    """``?since=`` for delta responses: an ISO datetime, or None."""
+    return _param(params, 'since', _datetime)
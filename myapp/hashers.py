@@ -0,0 +1,28 @@
+"""
+Django's Argon2 and PBKDF2 hashers with their cost taken from settings
+(ARGON2_* and PBKDF2_ITERATIONS), so each deployment can trade login
+throughput against hashing cost. Django rehashes a password at its owner's
+next login whenever the preferred hasher or these costs change.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PBKDF2_ITERATIONS or PBKDF2PasswordHasher.iterations
@@ -0,0 +1,97 @@
+"""
+Idempotency-Key support for booking writes.
+
+A client that may retry a request (e.g. after a timeout) sends the same
+``Idempotency-Key`` header with every attempt. The first attempt runs and
+its response, success or error, is stored; retries within
+IDEMPOTENCY_KEY_TTL seconds get that response back, marked with
+``Idempotent-Replayed: true``, without validating or writing anything.
+
+The key row is inserted before the view runs and in the same transaction,
+so a concurrent retry waits on the unique index and then replays the
+committed response. A server error rolls everything back and frees the key.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def expired_before():
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def _claim(user, key, digest):
+    """Insert the key, or return the row a concurrent attempt stored."""
+    IdempotencyKey.objects.filter(user=user, key=key, created_at__lte=expired_before()).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(user=user, key=key, fingerprint=digest), None
+    except IntegrityError:
+        return None, IdempotencyKey.objects.get(user=user, key=key)
+
+
+def _replay(stored, digest):
+    if stored.fingerprint != digest:
+        return Response({"detail": f"{HEADER} was already used for a different request."}, status=422)
+    if stored.status_code is None:
+        return Response({"detail": f"A request with this {HEADER} is still in progress."}, status=409)
+    response = Response(stored.response, status=stored.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Honour ``Idempotency-Key`` on an authenticated view function or viewset method."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args[:2] if isinstance(arg, Request))
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return Response({"detail": f"{HEADER} must be at most 255 characters."}, status=400)
+
+        digest = fingerprint(request)
+        # Retries usually arrive after the first attempt finished: one read.
+        stored = IdempotencyKey.objects.filter(user=request.user, key=key, created_at__gt=expired_before()).first()
+        if stored is not None:
+            return _replay(stored, digest)
+
+        with transaction.atomic():
+            entry, stored = _claim(request.user, key, digest)
+            if stored is not None:
+                return _replay(stored, digest)
+            try:
+                with transaction.atomic():
+                    response = view(*args, **kwargs)
+            except Exception as exc:
+                # Store client errors (e.g. a 409 for a taken seat) like any
+                # other first response; anything unhandled propagates.
+                response = api_settings.EXCEPTION_HANDLER(exc, {'request': request, 'args': args, 'kwargs': kwargs})
+                if response is None:
+                    raise
+                # The view's writes were already undone with its savepoint;
+                # keep the key row that the handler just marked for rollback.
+                transaction.set_rollback(False)
+            IdempotencyKey.objects.filter(pk=entry.pk).update(status_code=response.status_code, response=response.data)
+        return response
+
+    return wrapper
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myapp.archive import archive_departures, departed
+from myapp.models import Booking
+from myapp.routers import use_primary
+
+
+class Command(BaseCommand):
+    help = (
+        "Move schedules that departed more than --days ago, and their bookings, into "
+        "the archive tables in batched transactions. Safe to interrupt and rerun; "
+        "run it nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived.")
+
+    def handle(self, *args, **options):
+        with use_primary():
+            self.archive(options)
+
+    def archive(self, options):
+        before = timezone.now() - timedelta(days=options['days'])
+        if options['dry_run']:
+            schedules = departed(before)
+            bookings = Booking.objects.filter(schedule__in=schedules).count()
+            self.stdout.write(f"Would archive {schedules.count()} schedule(s) and {bookings} booking(s) before {before:%Y-%m-%d}")
+            return
+
+        schedules, bookings = archive_departures(before, options['batch_size'])
+        self.stdout.write(f"Archived {schedules} schedule(s) and {bookings} booking(s) before {before:%Y-%m-%d}")
@@ -0,0 +1,46 @@
+import os
+
+from django.contrib.auth.hashers import check_password, get_hasher
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from myapp.benchmarking import format_summary, login_samples, parallel_login_rate, seed_users, summarize, timed
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark POST /api/login/ with the configured PASSWORD_HASHER and report "
+        "logins/sec per core, for sizing instances. Creates benchlogin_* users, so "
+        "point it at a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=50, help="Logins per process.")
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help="Also measure this many processes logging in at once.")
+        parser.add_argument('--password', default='loadtest-pass')
+
+    def handle(self, *args, **options):
+        runs, processes, password = options['runs'], max(1, options['processes']), options['password']
+        seed_users(processes, password, prefix='benchlogin')
+        usernames = [f'benchlogin_{i}' for i in range(processes)]
+        # Bring stored hashes up to the current hasher and costs first.
+        for username in usernames:
+            login_samples(username, password, 1)
+
+        hasher = get_hasher()
+        encoded = User.objects.get(username=usernames[0]).password
+        params = ', '.join(f'{k}={v}' for k, v in hasher.safe_summary(encoded).items() if k not in ('algorithm', 'hash', 'salt'))
+        self.stdout.write(f"Hasher: {hasher.algorithm} ({params}); cores available: {os.cpu_count()}")
+
+        self.stdout.write(format_summary("password check", summarize(timed(lambda: check_password(password, encoded), runs))))
+        samples = login_samples(usernames[0], password, runs)
+        self.stdout.write(format_summary("POST /api/login/", summarize(samples)))
+        self.stdout.write(f"1 process: {1000 * len(samples) / sum(samples):.1f} logins/s per core")
+
+        if processes > 1:
+            rate = parallel_login_rate(usernames, password, runs)
+            cores = min(processes, os.cpu_count() or 1)
+            self.stdout.write(
+                f"{processes} processes: {rate:.1f} logins/s in total, {rate / cores:.1f} per core"
+            )
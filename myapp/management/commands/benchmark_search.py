@@ -0,0 +1,58 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+from django.test import Client
+
+from myapp.benchmarking import format_summary, seed_catalog, summarize, timed
+from myapp.filters import search_schedules
+from myapp.models import Route, Schedule
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark GET /api/schedules/search/: print the query plan and latency "
+        "percentiles. --seed inserts test data, so point it at a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Insert this many schedules first (e.g. 100000).")
+        parser.add_argument('--runs', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.stdout.write(f"Seeding {options['seed']} schedules...")
+            seed_catalog(options['seed'])
+
+        routes = list(Route.objects.values_list('from_location', 'to_location'))
+        if not routes:
+            self.stderr.write("No routes found; run with --seed 100000 on a scratch database.")
+            return
+        self.stdout.write(f"{Schedule.objects.count()} schedules, {len(routes)} routes")
+
+        rng = random.Random(0)
+        queryset = Schedule.objects.select_related('route', 'bus')
+
+        def params():
+            origin, destination = rng.choice(routes)
+            query = QueryDict(mutable=True)
+            query.update({'from': origin, 'to': destination})
+            return query
+
+        sample = search_schedules(queryset, params()).order_by('departure_time', 'id')[:50]
+        self.stdout.write("\nQuery plan:")
+        self.stdout.write(sample.explain())
+        self.stdout.write("")
+
+        query_samples = timed(
+            lambda: list(search_schedules(queryset, params()).order_by('departure_time', 'id')[:50]),
+            options['runs'],
+        )
+        self.stdout.write(format_summary("search query (50 rows)", summarize(query_samples)))
+
+        client = Client()
+        endpoint_samples = timed(
+            lambda: client.get('/api/schedules/search/', params()),
+            options['runs'],
+        )
+        self.stdout.write(format_summary("GET /api/schedules/search/", summarize(endpoint_samples)))
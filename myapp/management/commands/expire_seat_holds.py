@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myapp.models import SeatHold
+from myapp.services import release_holds
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired seat holds and announce their seats as released. Reads only "
+        "the expires_at index. Expired holds are already ignored everywhere, so this "
+        "just keeps the table small and seat pickers current."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', type=int, metavar='SECONDS', help="Keep sweeping every SECONDS seconds.")
+
+    def handle(self, *args, **options):
+        while True:
+            released = self.sweep(options['batch_size'])
+            if released:
+                self.stdout.write(f"Released {released} expired hold(s)")
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
+
+    def sweep(self, batch_size):
+        released = 0
+        now = timezone.now()
+        while True:
+            ids = list(
+                SeatHold.objects.filter(expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return released
+            # Re-check expiry: a hold extended since the SELECT is still in use.
+            released += release_holds(SeatHold.objects.filter(pk__in=ids, expires_at__lte=now))
@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from myapp.catalog_io import FIELDS, FORMATS, export_catalog
+
+
+class Command(BaseCommand):
+    help = "Stream routes, buses or schedules as CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(FIELDS))
+        parser.add_argument('--format', dest='file_format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', '-o', help="File to write; defaults to stdout.")
+
+    def handle(self, *args, **options):
+        out = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for chunk in export_catalog(options['kind'], options['file_format']):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
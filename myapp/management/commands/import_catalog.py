@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.catalog_io import FIELDS, FORMATS, CatalogImportError, guess_format, import_catalog
+
+
+class Command(BaseCommand):
+    help = "Import routes, buses or schedules from a CSV or JSON Lines file ('-' reads stdin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(FIELDS))
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=FORMATS)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Validate and roll back.")
+
+    def handle(self, *args, **options):
+        file_format = options['file_format'] or guess_format(options['path'])
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        try:
+            totals = import_catalog(
+                options['kind'], stream, file_format,
+                chunk_size=options['chunk_size'], dry_run=options['dry_run'],
+            )
+        except CatalogImportError as exc:
+            for error in exc.errors[:50]:
+                self.stderr.write(f"line {error['line']}: {error.get('field', '')} {error['error']}")
+            raise CommandError(f"Import aborted: {exc}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        suffix = " (dry run, rolled back)" if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['created']} created, {totals['updated']} updated{suffix}"
+        ))
@@ -0,0 +1,132 @@
+import json
+from pathlib import Path
+from urllib.parse import quote
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.benchmarking import HttpClient, LoadTest, compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a running server (runserver, gunicorn, ...) with concurrent clients: "
+        "schedule list, search, seat map, book/cancel and login. Reports p50/p95/p99 "
+        "and throughput, and fails if --baseline shows a regression. Seed the "
+        "server's database with seed_data first; the database it uses (SQLite or "
+        "DATABASE_URL) is what gets measured. Turn the server's throttles off "
+        "(empty THROTTLE_*_RATE variables) or they will answer most requests with 429."
+    )
+
+    scenarios = ('schedule_list', 'schedule_search', 'available_seats', 'booking', 'login')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000/api')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=500, help="Iterations per scenario.")
+        parser.add_argument('--scenario', action='append', choices=self.scenarios,
+                            help="Run only these scenarios (repeatable).")
+        parser.add_argument('--users', type=int, default=50, help="Seeded users to log in as.")
+        parser.add_argument('--password', default='loadtest-pass')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--baseline', help="JSON report to compare against.")
+        parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown, as a fraction.")
+        parser.add_argument('--save', help="Write this run's report to a JSON file (e.g. a new baseline).")
+
+    def handle(self, *args, **options):
+        base_url = options['base_url']
+        anonymous = HttpClient(base_url)
+
+        tokens = []
+        for i in range(options['users']):
+            status, body, _ = anonymous.request(
+                'POST', '/login/', {'username': f'loadtest_{i}', 'password': options['password']},
+            )
+            if status == 200:
+                tokens.append(body['token'])
+        if not tokens:
+            raise CommandError(f"Could not log in as loadtest_N at {base_url}; run seed_data first.")
+        clients = [HttpClient(base_url, token) for token in tokens]
+
+        status, body, _ = anonymous.request('GET', '/schedules/?page_size=500')
+        rows = (body or {}).get('results', []) if status == 200 else []
+        schedules = [
+            (row['id'], row['route_details']['from_location'], row['route_details']['to_location'])
+            for row in rows if row['available_seats']
+        ]
+        if not schedules:
+            raise CommandError("No schedules with free seats; run seed_data first.")
+
+        def schedule_list(rng):
+            status, _, elapsed = rng.choice(clients).request('GET', '/schedules/')
+            return [('GET /schedules/', status, elapsed)]
+
+        def schedule_search(rng):
+            _, origin, destination = rng.choice(schedules)
+            query = f'?from={quote(origin)}&to={quote(destination)}'
+            status, _, elapsed = anonymous.request('GET', '/schedules/search/' + query)
+            return [('GET /schedules/search/', status, elapsed)]
+
+        def available_seats(rng):
+            schedule_id = rng.choice(schedules)[0]
+            status, _, elapsed = anonymous.request('GET', f'/schedules/{schedule_id}/available_seats/')
+            return [('GET available_seats', status, elapsed)]
+
+        def booking(rng):
+            client = rng.choice(clients)
+            schedule_id = rng.choice(schedules)[0]
+            status, body, elapsed = client.request('GET', f'/schedules/{schedule_id}/available_seats/')
+            samples = [('GET available_seats', status, elapsed)]
+            free = (body or {}).get('available_seats') if status == 200 else None
+            if not free:
+                return samples
+            status, body, elapsed = client.request(
+                'POST', '/bookings/', {'schedule': schedule_id, 'seat_number': rng.choice(free)},
+            )
+            # 409 is a lost race for the seat, which is expected under load.
+            samples.append(('POST /bookings/', status, elapsed))
+            if status == 201:
+                status, _, elapsed = client.request('DELETE', f"/bookings/{body['id']}/")
+                samples.append(('DELETE /bookings/{id}/', status, elapsed))
+            return samples
+
+        def login(rng):
+            status, _, elapsed = anonymous.request(
+                'POST', '/login/',
+                {'username': f'loadtest_{rng.randrange(len(tokens))}', 'password': options['password']},
+            )
+            return [('POST /login/', status, elapsed)]
+
+        scenarios = {
+            'schedule_list': schedule_list,
+            'schedule_search': schedule_search,
+            'available_seats': available_seats,
+            'booking': booking,
+            'login': login,
+        }
+        runner = LoadTest(options['concurrency'], options['seed'])
+        report = {}
+        for name in options['scenario'] or self.scenarios:
+            self.stdout.write(f"Running {name} ({options['requests']} iterations, {options['concurrency']} clients)...")
+            for operation, row in runner.run(scenarios[name], options['requests']).items():
+                report[f'{name}: {operation}'] = row
+
+        self.stdout.write("")
+        for operation, row in sorted(report.items()):
+            statuses = ' '.join(f'{code}:{hits}' for code, hits in row['statuses'].items())
+            self.stdout.write(
+                f"{operation:<40} p50 {row['p50']:8.2f} ms  p95 {row['p95']:8.2f} ms  p99 {row['p99']:8.2f} ms  "
+                f"{row['throughput']:8.1f} req/s  [{statuses}]"
+            )
+
+        if options['save']:
+            Path(options['save']).write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(f"\nSaved report to {options['save']}")
+
+        if options['baseline']:
+            baseline = json.loads(Path(options['baseline']).read_text())
+            regressions = compare(report, baseline, options['tolerance'])
+            if regressions:
+                for line in regressions:
+                    self.stderr.write(f"REGRESSION {line}")
+                raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
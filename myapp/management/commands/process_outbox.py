@@ -0,0 +1,67 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myapp import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued outbox messages (booking confirmations, cancellations, ...) to "
+        "the OUTBOX_HANDLERS, --workers at a time, retrying failures with backoff. "
+        "Several copies can run at once on Postgres; they skip each other's rows. "
+        "Messages that fail OUTBOX_MAX_ATTEMPTS times are reported as dead letters."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Handler threads.")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', type=float, metavar='SECONDS', help="Keep polling, sleeping SECONDS when idle.")
+        parser.add_argument('--purge-after', type=int, metavar='DAYS', default=settings.OUTBOX_RETENTION_DAYS,
+                            help="Delete messages processed more than DAYS ago.")
+        parser.add_argument('--purge-dead-after', type=int, metavar='DAYS',
+                            default=settings.OUTBOX_DEAD_LETTER_RETENTION_DAYS,
+                            help="Delete dead letters queued more than DAYS ago.")
+
+    def handle(self, *args, **options):
+        reported = None
+        with ThreadPoolExecutor(options['workers']) as pool:
+            while True:
+                delivered, failed, dead = self.drain(pool, options['batch_size'])
+                if delivered or failed:
+                    self.stdout.write(f"Delivered {delivered} message(s), {failed} failed")
+                if dead:
+                    self.stdout.write(self.style.ERROR(
+                        f"{dead} message(s) gave up after {settings.OUTBOX_MAX_ATTEMPTS} attempts"
+                    ))
+                now = timezone.now()
+                purged, purged_dead = outbox.purge(
+                    now - timedelta(days=options['purge_after']), now - timedelta(days=options['purge_dead_after']),
+                )
+                if purged or purged_dead:
+                    self.stdout.write(f"Purged {purged} processed message(s) and {purged_dead} dead letter(s)")
+                # Say how many dead letters wait, each time the number changes.
+                waiting = outbox.dead_letters().count()
+                if waiting != reported:
+                    if waiting:
+                        self.stdout.write(self.style.WARNING(
+                            f"{waiting} dead letter(s) left undelivered; see their last_error"
+                        ))
+                    reported = waiting
+                if not options['loop']:
+                    break
+                time.sleep(options['loop'])
+
+    def drain(self, pool, batch_size):
+        delivered = failed = dead = 0
+        while batch := outbox.claim(batch_size):
+            results = list(zip(batch, pool.map(outbox.deliver, batch)))
+            ok, errors, gave_up = outbox.record(results)
+            delivered += ok
+            failed += errors
+            dead += gave_up
+        return delivered, failed, dead
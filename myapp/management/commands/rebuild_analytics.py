@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from myapp import analytics
+from myapp.routers import use_primary
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the occupancy/revenue rollups from the live and archived tables, "
+        "for all days or a --since/--until range. Bookings keep the rollups current "
+        "on their own; run this after bulk data changes or to repair drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=parse_date, help="First departure day (YYYY-MM-DD).")
+        parser.add_argument('--until', type=parse_date, help="Last departure day (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with use_primary():
+            rows = analytics.rebuild(options['since'], options['until'])
+        self.stdout.write(f"Rebuilt {rows} rollup row(s) in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.utils import timezone
+
+from myapp.models import Schedule
+from myapp.routers import use_primary
+from myapp.services import expected_available_seats
+
+
+class Command(BaseCommand):
+    help = "Recompute Schedule.available_seats from confirmed bookings and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without fixing it.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # The fixes are written to the primary, so compute them from it too.
+        with use_primary():
+            self.reconcile(options)
+
+    def reconcile(self, options):
+        drifted = (
+            Schedule.objects.annotate(expected=expected_available_seats())
+            .exclude(available_seats=F('expected'))
+            .only('id', 'available_seats')
+        )
+
+        now = timezone.now()
+        fixed = []
+        for schedule in drifted.iterator(chunk_size=options['batch_size']):
+            self.stdout.write(
+                f"Schedule {schedule.pk}: {schedule.available_seats} -> {schedule.expected}"
+            )
+            schedule.available_seats = schedule.expected
+            schedule.updated_at = now
+            fixed.append(schedule)
+
+        if fixed and not options['dry_run']:
+            Schedule.objects.bulk_update(fixed, ['available_seats', 'updated_at'], batch_size=options['batch_size'])
+
+        verb = "would be fixed" if options['dry_run'] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"{len(fixed)} schedule(s) {verb}"))
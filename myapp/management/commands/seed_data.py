@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from myapp.benchmarking import seed_bookings, seed_catalog, seed_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-insert load-test data: schedules, users (password --password) and "
+        "bookings. Only run this against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedules', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--bookings', type=int, default=1000000)
+        parser.add_argument('--password', default='loadtest-pass')
+        parser.add_argument('--fill', type=float, default=0.8, help="Most a schedule is filled, as a fraction of seats.")
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for reproducible data.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        steps = (
+            ('schedules', lambda: seed_catalog(options['schedules'], batch_size=batch_size, seed=options['seed'])),
+            ('users', lambda: seed_users(options['users'], options['password'], batch_size=batch_size)),
+        )
+        results = {}
+        for label, step in steps:
+            started = time.perf_counter()
+            with transaction.atomic():
+                results[label] = step()
+            self.stdout.write(f"Seeded {label} in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            created = seed_bookings(
+                options['bookings'], results['users'], fill=options['fill'],
+                batch_size=batch_size, seed=options['seed'],
+            )
+        self.stdout.write(f"Seeded {created} bookings in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,107 @@
+"""
+In-process request metrics, rendered in the Prometheus text format.
+
+Each worker process keeps its own counters; scrape every worker (or sum
+them in Prometheus) for totals.
+"""
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+# Upper bounds in seconds, Prometheus' default latency buckets.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _ViewStats:
+    __slots__ = ('buckets', 'count', 'duration', 'queries', 'db_time', 'response_bytes', 'n_plus_one', 'statuses')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.response_bytes = 0
+        self.n_plus_one = 0
+        self.statuses = defaultdict(int)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(_ViewStats)
+
+    def observe(self, view, method, status, duration, queries, db_time, response_bytes, n_plus_one):
+        with self._lock:
+            stats = self._views[(view, method)]
+            stats.buckets[bisect_left(BUCKETS, duration)] += 1
+            stats.count += 1
+            stats.duration += duration
+            stats.queries += queries
+            stats.db_time += db_time
+            stats.response_bytes += response_bytes
+            stats.n_plus_one += n_plus_one
+            stats.statuses[status] += 1
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        with self._lock:
+            views = {key: _copy(stats) for key, stats in self._views.items()}
+
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        family('http_request_duration_seconds', 'histogram', "Request latency by view.")
+        for (view, method), stats in sorted(views.items()):
+            labels = f'view="{_escape(view)}",method="{method}"'
+            cumulative = 0
+            for bound, hits in zip(BUCKETS + (float('inf'),), stats.buckets):
+                cumulative += hits
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {stats.duration:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {stats.count}')
+
+        family('http_requests_total', 'counter', "Requests by view and status code.")
+        for (view, method), stats in sorted(views.items()):
+            for status, hits in sorted(stats.statuses.items()):
+                lines.append(f'http_requests_total{{view="{_escape(view)}",method="{method}",status="{status}"}} {hits}')
+
+        for name, attr, help_text, fmt in (
+            ('http_request_db_queries_total', 'queries', "Database queries issued.", '{}'),
+            ('http_request_db_seconds_total', 'db_time', "Time spent in database queries.", '{:.6f}'),
+            ('http_response_size_bytes_total', 'response_bytes', "Response body bytes (non-streaming).", '{}'),
+            ('http_request_n_plus_one_total', 'n_plus_one', "Requests that repeated identical SQL.", '{}'),
+        ):
+            family(name, 'counter', help_text)
+            for (view, method), stats in sorted(views.items()):
+                value = fmt.format(getattr(stats, attr))
+                lines.append(f'{name}{{view="{_escape(view)}",method="{method}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+
+def gauge(name, help_text, value):
+    """One unlabelled gauge in the text format, for values read at scrape time."""
+    return f"# HELP {name} {help_text}\n# TYPE {name} gauge\n{name} {value}\n"
+
+
+def _copy(stats):
+    clone = _ViewStats()
+    for slot in _ViewStats.__slots__:
+        value = getattr(stats, slot)
+        setattr(clone, slot, list(value) if slot == 'buckets' else dict(value) if slot == 'statuses' else value)
+    return clone
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+registry = Registry()
@@ -0,0 +1,163 @@
+import hashlib
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import registry
+from .routers import use_primary
+
+logger = logging.getLogger('myapp.performance')
+
+_current = ContextVar('request_query_stats', default=None)
+
+
+class QueryStats:
+    __slots__ = ('count', 'duration', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.duration += time.perf_counter() - started
+        stats.count += 1
+        stats.statements[sql] += 1
+
+
+def _install(connection, **kwargs):
+    # A permanent wrapper on every connection; it does nothing outside a
+    # request, and the context variable follows sync_to_async threads.
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_install)
+
+
+class PerformanceMiddleware:
+    """
+    Record per-view latency, query count/time and response size into
+    ``myapp.metrics.registry``, log repeated identical SQL (likely N+1) and
+    optionally add a ``Server-Timing`` header.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = QueryStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    def finish(self, request, response, stats, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match.route) if match else 'unmatched'
+
+        n_plus_one = 0
+        threshold = settings.PERF_N_PLUS_ONE_THRESHOLD
+        if stats.statements:
+            sql, repeats = stats.statements.most_common(1)[0]
+            if repeats >= threshold:
+                n_plus_one = 1
+                logger.warning("Possible N+1 in %s %s: %d x %s", request.method, view, repeats, sql[:300])
+
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(
+            view, request.method, response.status_code, duration,
+            stats.count, stats.duration, size, n_plus_one,
+        )
+
+        if settings.PERF_SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", '
+                f'total;dur={duration * 1000:.1f}'
+            )
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Keep writes, and a client's reads for REPLICA_STICKY_SECONDS after a
+    successful write, on the primary database (see myapp.routers). Clients
+    are told apart by their Authorization header.
+    """
+    sync_capable = True
+    async_capable = True
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def sticky_key(request):
+        credentials = request.headers.get('Authorization')
+        if not credentials:
+            return None
+        return 'replica:sticky:' + hashlib.sha256(credentials.encode()).hexdigest()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        key = self.sticky_key(request)
+        write = request.method not in self.SAFE_METHODS
+        with use_primary(write or bool(key and cache.get(key))):
+            response = self.get_response(request)
+        if write and key and response.status_code < 400:
+            cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        key = self.sticky_key(request)
+        write = request.method not in self.SAFE_METHODS
+        with use_primary(write or bool(key and await cache.aget(key))):
+            response = await self.get_response(request)
+        if write and key and response.status_code < 400:
+            await cache.aset(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
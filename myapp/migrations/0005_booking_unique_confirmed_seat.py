@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:51
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def cancel_double_sold_seats(apps, schema_editor):
+    """Keep the earliest confirmed booking per seat so the constraint can be added."""
+    Booking = apps.get_model('myapp', 'Booking')
+    duplicates = (
+        Booking.objects.filter(status='confirmed')
+        .values('schedule_id', 'seat_number')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for dup in list(duplicates):
+        seat_bookings = Booking.objects.filter(
+            status='confirmed', schedule_id=dup['schedule_id'], seat_number=dup['seat_number']
+        )
+        keep = seat_bookings.order_by('booked_at', 'id').values_list('id', flat=True).first()
+        seat_bookings.exclude(id=keep).update(status='cancelled', cancelled_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_booking_cancelled_at_booking_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_double_sold_seats, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'confirmed')), fields=('schedule', 'seat_number'), name='unique_confirmed_seat'),
+        ),
+    ]
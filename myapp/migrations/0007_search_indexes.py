@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_listing_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(fields=['from_location', 'to_location'], name='route_origin_destination_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['route', 'departure_time'], name='schedule_route_departure_idx'),
+        ),
+    ]
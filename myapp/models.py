@@ -1,11 +1,22 @@
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Create your models here.
 class Route(models.Model):
     from_location = models.CharField(max_length=100)
     to_location = models.CharField(max_length=100)
     distance = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['from_location', 'to_location'], name='route_origin_destination_idx'),
+        ]
+
     def __str__(self):
         return f"{self.from_location} to {self.to_location}"
     
@@ -13,6 +24,8 @@ class Bus(models.Model):
     bus_number = models.CharField(max_length=50)
     bus_name = models.CharField(max_length=100)
     total_seats = models.IntegerField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     def __str__(self):
         return self.bus_number
 
@@ -22,6 +35,15 @@ class Schedule(models.Model):
     departure_time = models.DateTimeField()
     price = models.DecimalField(max_digits=10, decimal_places=2  )
     available_seats = models.IntegerField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['departure_time', 'id'], name='schedule_departure_idx'),
+            models.Index(fields=['price'], name='schedule_price_idx'),
+            models.Index(fields=['route', 'departure_time'], name='schedule_route_departure_idx'),
+        ]
+
     def __str__(self):
         return f"{self.route} - {self.departure_time}"
      
@@ -39,6 +61,157 @@ class Booking(models.Model):
     booked_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=BOOKING_STATUS_CHOICES, default='confirmed')
     cancelled_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            # A seat can be sold once per schedule; cancelled rows don't count.
+            models.UniqueConstraint(
+                fields=['schedule', 'seat_number'],
+                condition=models.Q(status='confirmed'),
+                name='unique_confirmed_seat',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'status'], name='booking_user_status_idx'),
+            models.Index(fields=['schedule', 'status'], name='booking_schedule_status_idx'),
+            models.Index(fields=['status', 'id'], name='booking_status_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.schedule} - {self.status}"
\ No newline at end of file
+        return f"{self.user.username} - {self.schedule} - {self.status}"
+
+class SeatHold(models.Model):
+    """A seat reserved for one user until ``expires_at``; expired rows are ignored."""
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE)
+    seat_number = models.IntegerField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['schedule', 'seat_number'], name='unique_seat_hold'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} holds seat {self.seat_number} on {self.schedule}"
+
+
+# Departed schedules and their bookings are moved here by the
+# archive_departures command, keeping their ids, so the live tables only
+# hold what availability and booking queries actually touch.
+class ArchivedSchedule(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    route = models.ForeignKey(Route, on_delete=models.CASCADE)
+    bus = models.ForeignKey(Bus, on_delete=models.CASCADE)
+    departure_time = models.DateTimeField(db_index=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.route} - {self.departure_time} (archived)"
+
+
+class ArchivedBooking(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    schedule = models.ForeignKey(ArchivedSchedule, on_delete=models.CASCADE)
+    seat_number = models.IntegerField()
+    booked_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Booking.BOOKING_STATUS_CHOICES)
+    cancelled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='archived_booking_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.schedule} - {self.status}"
+
+
+class OutboxMessage(models.Model):
+    """Follow-up work for a booking change, written in the same transaction; see myapp.outbox."""
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField()
+    # Handed to handlers so they can ignore a message delivered twice.
+    idempotency_key = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['available_at', 'id'],
+                condition=models.Q(processed_at__isnull=True),
+                name='outbox_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} {self.idempotency_key}"
+
+
+class IdempotencyKey(models.Model):
+    """The first response to a request sent with an Idempotency-Key header; see myapp.idempotency."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    # sha256 of method, path and body, so a reused key can't replay another request.
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key}"
+
+
+class OccupancyRollup(models.Model):
+    """
+    Seats offered, bookings and revenue per departure day, route and bus,
+    kept current by myapp.analytics as bookings change so the admin
+    analytics never scan the booking tables.
+    """
+    day = models.DateField()
+    route = models.ForeignKey(Route, on_delete=models.CASCADE)
+    bus = models.ForeignKey(Bus, on_delete=models.CASCADE)
+    schedules = models.IntegerField(default=0)
+    seats = models.IntegerField(default=0)
+    confirmed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'route', 'bus'], name='unique_occupancy_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.route} {self.bus}"
+
+
+class Tombstone(models.Model):
+    """A deleted row, so the dashboard's ``since=`` deltas can report removals."""
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
+
+
+class UserChange(models.Model):
+    """When a user's dashboard fields last changed, since User has no ``updated_at``; see myapp.signals."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='dashboard_change')
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} {self.updated_at}"
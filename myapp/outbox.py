@@ -0,0 +1,144 @@
+"""
+Transactional outbox for work that follows a booking change: receipts,
+tickets, notifications, analytics.
+
+The booking services write an OutboxMessage in the same transaction as the
+change, so a message exists exactly when the change committed and the
+request never waits for the follow-up work. The process_outbox command
+delivers messages to the handlers listed in OUTBOX_HANDLERS and retries
+failures with exponential backoff. A message that fails
+OUTBOX_MAX_ATTEMPTS times becomes a dead letter: it is no longer retried,
+is reported by process_outbox and /api/metrics/, and is purged after
+OUTBOX_DEAD_LETTER_RETENTION_DAYS.
+
+Delivery is at least once: a handler may see a message again after a
+crash or after another handler for the same message failed, so it should
+use ``message.idempotency_key`` to skip repeats.
+"""
+import logging
+from datetime import timedelta
+from functools import cache
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxMessage
+
+logger = logging.getLogger('myapp.outbox')
+
+BOOKING_CONFIRMED = 'booking.confirmed'
+BOOKING_CANCELLED = 'booking.cancelled'
+BOOKING_CHANGED = 'booking.changed'
+BOOKING_DELETED = 'booking.deleted'
+
+
+def booking_payload(booking):
+    return {
+        'booking': booking.pk,
+        'user': booking.user_id,
+        'schedule': booking.schedule_id,
+        'seat_number': booking.seat_number,
+        'status': booking.status,
+    }
+
+
+def enqueue(topic, bookings):
+    """Queue one ``topic`` message per booking; call inside the booking's transaction."""
+    OutboxMessage.objects.bulk_create(
+        OutboxMessage(topic=topic, payload=booking_payload(booking)) for booking in bookings
+    )
+
+
+@cache
+def _import(path):
+    return import_string(path)
+
+
+def handlers_for(topic):
+    """Handlers for ``topic`` followed by the catch-all ``'*'`` handlers."""
+    paths = [*settings.OUTBOX_HANDLERS.get(topic, ()), *settings.OUTBOX_HANDLERS.get('*', ())]
+    return [_import(path) for path in paths]
+
+
+def pending(now=None):
+    return OutboxMessage.objects.filter(
+        processed_at__isnull=True,
+        available_at__lte=now or timezone.now(),
+        attempts__lt=settings.OUTBOX_MAX_ATTEMPTS,
+    )
+
+
+def dead_letters():
+    """Undelivered messages that used up OUTBOX_MAX_ATTEMPTS."""
+    return OutboxMessage.objects.filter(
+        processed_at__isnull=True,
+        attempts__gte=settings.OUTBOX_MAX_ATTEMPTS,
+    )
+
+
+def claim(batch_size, lease=timedelta(minutes=5)):
+    """
+    Lease up to ``batch_size`` due messages to this worker by pushing their
+    ``available_at`` past ``lease``; a worker that dies mid-batch leaves
+    them to be picked up again when the lease runs out. Concurrent workers
+    skip each other's locked rows.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            pending(now).select_for_update(skip_locked=True)
+            .order_by('available_at', 'id')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        OutboxMessage.objects.filter(pk__in=ids).update(available_at=now + lease)
+    return list(OutboxMessage.objects.filter(pk__in=ids).order_by('id'))
+
+
+def deliver(message):
+    """Run every handler for ``message``; returns the error, or None on success."""
+    close_old_connections()
+    try:
+        for handler in handlers_for(message.topic):
+            handler(message)
+    except Exception as exc:
+        logger.warning("Outbox message %s (%s) failed: %r", message.pk, message.topic, exc)
+        return exc
+    return None
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1), 3600))
+
+
+def record(results):
+    """
+    Mark delivered messages processed in one UPDATE and reschedule failures.
+    Returns ``(delivered, failed, dead)``, where ``dead`` counts the failures
+    that just used up their last attempt.
+    """
+    now = timezone.now()
+    done = [message.pk for message, error in results if error is None]
+    OutboxMessage.objects.filter(pk__in=done).update(processed_at=now)
+    dead = 0
+    for message, error in results:
+        if error is not None:
+            attempts = message.attempts + 1
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                attempts=attempts, last_error=repr(error)[:2000], available_at=now + backoff(attempts),
+            )
+            if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                dead += 1
+                logger.error("Outbox message %s (%s) gave up after %d attempts: %r", message.pk, message.topic, attempts, error)
+    return len(done), len(results) - len(done), dead
+
+
+def purge(older_than, dead_older_than):
+    """
+    Delete messages processed before ``older_than`` and dead letters queued
+    before ``dead_older_than``; returns how many of each were deleted.
+    """
+    processed = OutboxMessage.objects.filter(processed_at__lt=older_than).delete()[0]
+    dead = dead_letters().filter(created_at__lt=dead_older_than).delete()[0]
+    return processed, dead
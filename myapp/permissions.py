@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 from rest_framework import permissions
 
 
@@ -9,3 +11,13 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
         return request.user and request.user.is_staff
+
+
+class HasMetricsToken(permissions.BasePermission):
+    """
+    Allow scrapers that send ``Authorization: Bearer <METRICS_TOKEN>``.
+    """
+    def has_permission(self, request, view):
+        token = settings.METRICS_TOKEN
+        header = request.headers.get('Authorization', '')
+        return bool(token) and constant_time_compare(header, f'Bearer {token}')
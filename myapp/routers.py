@@ -0,0 +1,65 @@
+"""
+Read-replica routing.
+
+With DATABASE_REPLICA_URLS set, reads of the catalog (routes, buses,
+schedules), archived booking history and analytics rollups go to a random
+replica; everything else, and every write, uses the primary. Reads stay on
+the primary while:
+
+- a transaction is open on it, so seat checks and ``select_for_update``
+  see the rows they lock;
+- the request is a write (see myapp.middleware.ReplicaMiddleware), so
+  booking validation reads the primary;
+- the client wrote within REPLICA_STICKY_SECONDS, so it reads its own
+  bookings, cancellations and catalog edits back.
+
+Other clients' uncached reads may lag behind the primary by the
+replication delay. Cached catalog responses are always built from the
+primary (see myapp.cache), so a stale replica read is never cached.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICATED = {
+    'myapp.route', 'myapp.bus', 'myapp.schedule',
+    'myapp.archivedschedule', 'myapp.archivedbooking', 'myapp.occupancyrollup',
+}
+
+_primary = ContextVar('use_primary', default=False)
+
+
+@contextmanager
+def use_primary(pinned=True):
+    """Send every read in the block to the primary."""
+    token = _primary.set(pinned)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            not settings.DATABASE_REPLICAS
+            or model._meta.label_lower not in REPLICATED
+            or _primary.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows, so a schedule read from one can
+        # be assigned to a booking written to the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,75 @@
+import base64
+
+from django.utils import timezone
+
+from .models import Booking, SeatHold
+
+
+class SeatMap:
+    """
+    Seat availability of one schedule as an int bitset.
+
+    Bit ``n - 1`` is set when seat ``n`` is free, so membership tests are O(1)
+    and the whole map packs into ``ceil(total_seats / 8)`` bytes.
+    """
+
+    ENCODINGS = ('list', 'ranges', 'bitmap')
+
+    def __init__(self, total_seats, booked_seats=()):
+        self.total_seats = total_seats
+        booked = 0
+        for seat in booked_seats:
+            if 1 <= seat <= total_seats:
+                booked |= 1 << (seat - 1)
+        self.bits = ((1 << total_seats) - 1) & ~booked
+
+    @staticmethod
+    def unavailable_seats(schedule, user=None):
+        """One query for seats that are booked or held by someone other than ``user``."""
+        booked = Booking.objects.filter(schedule=schedule, status='confirmed').values_list('seat_number', flat=True)
+        held = SeatHold.objects.filter(schedule=schedule, expires_at__gt=timezone.now())
+        if user is not None and user.is_authenticated:
+            held = held.exclude(user=user)
+        return booked.union(held.values_list('seat_number', flat=True), all=True)
+
+    @classmethod
+    def for_schedule(cls, schedule, user=None):
+        return cls(schedule.bus.total_seats, cls.unavailable_seats(schedule, user))
+
+    def is_available(self, seat):
+        return 1 <= seat <= self.total_seats and bool(self.bits >> (seat - 1) & 1)
+
+    def available(self):
+        bits, seats = self.bits, []
+        while bits:
+            lowest = bits & -bits
+            seats.append(lowest.bit_length())
+            bits ^= lowest
+        return seats
+
+    def ranges(self):
+        """Free seats as a range string, e.g. ``"1-4,7,9-40"``."""
+        parts = []
+        start = prev = None
+        for seat in self.available():
+            if prev is not None and seat == prev + 1:
+                prev = seat
+                continue
+            if start is not None:
+                parts.append(str(start) if start == prev else f"{start}-{prev}")
+            start = prev = seat
+        if start is not None:
+            parts.append(str(start) if start == prev else f"{start}-{prev}")
+        return ",".join(parts)
+
+    def bitmap(self):
+        """Free seats as base64 bytes, seat 1 in the low bit of the first byte."""
+        raw = self.bits.to_bytes((self.total_seats + 7) // 8, 'little')
+        return base64.b64encode(raw).decode('ascii')
+
+    def as_response(self, encoding='list'):
+        if encoding == 'ranges':
+            return {'total_seats': self.total_seats, 'encoding': 'ranges', 'available_seats': self.ranges()}
+        if encoding == 'bitmap':
+            return {'total_seats': self.total_seats, 'encoding': 'bitmap', 'available_seats': self.bitmap()}
+        return {'available_seats': self.available()}
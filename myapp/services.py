@@ -0,0 +1,279 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import analytics, cache, dashboard, events, outbox
+from .exceptions import SeatUnavailable
+from .models import Booking, Bus, Schedule, SeatHold
+
+
+def adjust_available_seats(schedule_id, delta):
+    """Apply ``delta`` to a schedule's seat counter in a single UPDATE."""
+    if delta:
+        Schedule.objects.filter(pk=schedule_id).update(
+            available_seats=F('available_seats') + delta, updated_at=timezone.now()
+        )
+        cache.invalidate('schedules')
+
+
+def expected_available_seats():
+    """Expression computing a schedule's free seats from the Booking table."""
+    total_seats = Bus.objects.filter(pk=OuterRef('bus_id')).values('total_seats')
+    confirmed = (
+        Booking.objects.filter(schedule=OuterRef('pk'), status='confirmed')
+        .order_by()
+        .values('schedule')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Subquery(total_seats) - Coalesce(Subquery(confirmed), Value(0))
+
+
+def recompute_available_seats(schedule_id):
+    """Rebuild the seat counter of one schedule, e.g. after its bus changed."""
+    Schedule.objects.filter(pk=schedule_id).update(
+        available_seats=expected_available_seats(), updated_at=timezone.now()
+    )
+    cache.invalidate('schedules')
+
+
+def recompute_bus_seats(bus_id):
+    """Rebuild the seat counters of every schedule of a bus after its capacity changed."""
+    Schedule.objects.filter(bus_id=bus_id).update(
+        available_seats=expected_available_seats(), updated_at=timezone.now()
+    )
+    cache.invalidate('schedules')
+
+
+def active_holds():
+    return SeatHold.objects.filter(expires_at__gt=timezone.now())
+
+
+def lock_seat(schedule_id, seat_number, exclude_pk=None, user=None):
+    """
+    Lock the schedule row and make sure ``seat_number`` is still free and
+    not held by anyone but ``user``.
+
+    Must run inside a transaction. Concurrent bookings for the same schedule
+    queue up on the row lock, so the check below can't go stale before the
+    caller inserts.
+    """
+    Schedule.objects.select_for_update().filter(pk=schedule_id).values_list('pk').first()
+    taken = Booking.objects.filter(schedule_id=schedule_id, seat_number=seat_number, status='confirmed')
+    if exclude_pk is not None:
+        taken = taken.exclude(pk=exclude_pk)
+    if taken.exists():
+        raise SeatUnavailable(seat_number)
+    held = active_holds().filter(schedule_id=schedule_id, seat_number=seat_number)
+    if user is not None:
+        held = held.exclude(user=user)
+    if held.exists():
+        raise SeatUnavailable(detail=f"Seat {seat_number} is held by another customer")
+
+
+def create_booking(**data):
+    with transaction.atomic():
+        if data.get('status', 'confirmed') == 'confirmed':
+            lock_seat(data['schedule'].pk, data['seat_number'], user=data.get('user'))
+            # The booking consumes the user's hold (and any expired one).
+            SeatHold.objects.filter(schedule=data['schedule'], seat_number=data['seat_number']).delete()
+        try:
+            # The savepoint keeps the outer transaction usable if the unique
+            # constraint fires on a backend without row locks (SQLite).
+            with transaction.atomic():
+                booking = Booking.objects.create(**data)
+        except IntegrityError:
+            raise SeatUnavailable(data['seat_number'])
+        analytics.record_bookings(booking.schedule, **{booking.status: 1})
+        if booking.status == 'confirmed':
+            adjust_available_seats(booking.schedule_id, -1)
+            events.publish_seats(booking.schedule_id, events.SEAT_TAKEN, [booking.seat_number])
+            outbox.enqueue(outbox.BOOKING_CONFIRMED, [booking])
+    return booking
+
+
+def create_bookings(user, legs):
+    """
+    Book several seats, possibly on several schedules, all or nothing.
+
+    ``legs`` maps each Schedule to its seat numbers. The schedules are locked
+    in primary-key order, every requested seat is checked with one query and
+    the bookings are written with a single bulk insert.
+    """
+    with transaction.atomic():
+        schedule_ids = sorted(schedule.pk for schedule in legs)
+        list(Schedule.objects.select_for_update().filter(pk__in=schedule_ids).order_by('pk').values_list('pk'))
+
+        wanted = Q()
+        for schedule, seats in legs.items():
+            wanted |= Q(schedule_id=schedule.pk, seat_number__in=seats)
+        taken = list(
+            Booking.objects.filter(wanted, status='confirmed')
+            .order_by('schedule_id', 'seat_number')
+            .values_list('schedule_id', 'seat_number')
+        )
+        if taken:
+            raise SeatUnavailable(detail="Already booked: " + ", ".join(
+                f"seat {seat} on schedule {schedule_id}" for schedule_id, seat in taken
+            ))
+        held = list(
+            active_holds().filter(wanted).exclude(user=user)
+            .order_by('schedule_id', 'seat_number')
+            .values_list('schedule_id', 'seat_number')
+        )
+        if held:
+            raise SeatUnavailable(detail="Held by another customer: " + ", ".join(
+                f"seat {seat} on schedule {schedule_id}" for schedule_id, seat in held
+            ))
+        SeatHold.objects.filter(wanted).delete()
+
+        try:
+            with transaction.atomic():
+                bookings = Booking.objects.bulk_create([
+                    Booking(user=user, schedule=schedule, seat_number=seat)
+                    for schedule, seats in legs.items()
+                    for seat in seats
+                ])
+        except IntegrityError:
+            raise SeatUnavailable(detail="One or more seats were booked by someone else")
+
+        for schedule, seats in legs.items():
+            adjust_available_seats(schedule.pk, -len(seats))
+            analytics.record_bookings(schedule, confirmed=len(seats))
+            events.publish_seats(schedule.pk, events.SEAT_TAKEN, seats)
+        outbox.enqueue(outbox.BOOKING_CONFIRMED, bookings)
+    return bookings
+
+
+def update_booking(booking, **changes):
+    """Save ``changes`` on a booking, moving its seat between schedule counters."""
+    with transaction.atomic():
+        old_schedule_id = booking.schedule_id
+        old_seat = booking.seat_number
+        old_status = booking.status
+        was_confirmed = old_status == 'confirmed'
+
+        for attr, value in changes.items():
+            setattr(booking, attr, value)
+        if booking.status == 'cancelled' and was_confirmed and booking.cancelled_at is None:
+            booking.cancelled_at = timezone.now()
+        if booking.status == 'confirmed':
+            lock_seat(booking.schedule_id, booking.seat_number, exclude_pk=booking.pk, user=booking.user)
+        try:
+            with transaction.atomic():
+                booking.save()
+        except IntegrityError:
+            raise SeatUnavailable(booking.seat_number)
+
+        if (old_schedule_id, old_status) != (booking.schedule_id, booking.status):
+            analytics.record_bookings(old_schedule_id, **{old_status: -1})
+            analytics.record_bookings(booking.schedule, **{booking.status: 1})
+
+        released = old_schedule_id if was_confirmed else None
+        taken = booking.schedule_id if booking.status == 'confirmed' else None
+        if released != taken:
+            if released is not None:
+                adjust_available_seats(released, 1)
+            if taken is not None:
+                adjust_available_seats(taken, -1)
+        if (released, old_seat) != (taken, booking.seat_number):
+            if released is not None:
+                events.publish_seats(released, events.SEAT_RELEASED, [old_seat])
+            if taken is not None:
+                events.publish_seats(taken, events.SEAT_TAKEN, [booking.seat_number])
+        cancelled = was_confirmed and booking.status == 'cancelled'
+        outbox.enqueue(outbox.BOOKING_CANCELLED if cancelled else outbox.BOOKING_CHANGED, [booking])
+    return booking
+
+
+def cancel_booking(booking):
+    """Soft-cancel a booking; returns False if it was no longer confirmed."""
+    now = timezone.now()
+    with transaction.atomic():
+        # Conditional UPDATE so two concurrent cancels release the seat once.
+        cancelled = Booking.objects.filter(pk=booking.pk, status='confirmed').update(
+            status='cancelled', cancelled_at=now, updated_at=now
+        )
+        if cancelled:
+            booking.status = 'cancelled'
+            booking.cancelled_at = now
+            adjust_available_seats(booking.schedule_id, 1)
+            analytics.record_bookings(booking.schedule_id, confirmed=-1, cancelled=1)
+            events.publish_seats(booking.schedule_id, events.SEAT_RELEASED, [booking.seat_number])
+            outbox.enqueue(outbox.BOOKING_CANCELLED, [booking])
+    return bool(cancelled)
+
+
+def delete_booking(booking):
+    with transaction.atomic():
+        status = (
+            Booking.objects.select_for_update()
+            .filter(pk=booking.pk)
+            .values_list('status', flat=True)
+            .first()
+        )
+        if status == 'confirmed':
+            adjust_available_seats(booking.schedule_id, 1)
+            events.publish_seats(booking.schedule_id, events.SEAT_RELEASED, [booking.seat_number])
+        outbox.enqueue(outbox.BOOKING_DELETED, [booking])
+        dashboard.record_deletion('bookings', [booking.pk])
+        schedule_id = booking.schedule_id
+        booking.delete()
+        # After the delete: without a rollup row this rebuilds from the tables.
+        if status is not None:
+            analytics.record_bookings(schedule_id, **{status: -1})
+
+
+def hold_seats(user, schedule, seats, minutes):
+    """
+    Hold ``seats`` for ``user`` for ``minutes``, all or nothing. Holding a
+    seat the user already holds extends it. Returns the new expiry time.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(minutes=minutes)
+    with transaction.atomic():
+        Schedule.objects.select_for_update().filter(pk=schedule.pk).values_list('pk').first()
+        # Lazy expiry: clear stale holds on just these seats.
+        SeatHold.objects.filter(schedule=schedule, seat_number__in=seats, expires_at__lte=now).delete()
+
+        booked = sorted(
+            Booking.objects.filter(schedule=schedule, seat_number__in=seats, status='confirmed')
+            .values_list('seat_number', flat=True)
+        )
+        if booked:
+            raise SeatUnavailable(detail=f"Already booked: {', '.join(map(str, booked))}")
+        holds = SeatHold.objects.filter(schedule=schedule, seat_number__in=seats)
+        held = sorted(holds.exclude(user=user).values_list('seat_number', flat=True))
+        if held:
+            raise SeatUnavailable(detail=f"Held by another customer: {', '.join(map(str, held))}")
+
+        already_mine = set(holds.values_list('seat_number', flat=True))
+        holds.update(expires_at=expires_at)
+        SeatHold.objects.bulk_create(
+            SeatHold(user=user, schedule=schedule, seat_number=seat, expires_at=expires_at)
+            for seat in seats if seat not in already_mine
+        )
+        new_seats = [seat for seat in seats if seat not in already_mine]
+        if new_seats:
+            events.publish_seats(schedule.pk, events.SEAT_HELD, new_seats)
+    return expires_at
+
+
+def release_holds(holds):
+    """
+    Delete holds and announce their seats as free again. The rows are locked
+    and then deleted by primary key, so a hold that stops matching ``holds``
+    meanwhile (e.g. one extended past an expiry filter) is kept.
+    """
+    released = {}
+    with transaction.atomic():
+        rows = list(holds.select_for_update().values_list('pk', 'schedule_id', 'seat_number'))
+        for _, schedule_id, seat in rows:
+            released.setdefault(schedule_id, []).append(seat)
+        SeatHold.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    for schedule_id, seats in released.items():
+        events.publish_seats(schedule_id, events.SEAT_RELEASED, seats)
+    return sum(len(seats) for seats in released.values())
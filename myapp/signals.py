@@ -0,0 +1,106 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from . import analytics, cache, dashboard, services
+from .authentication import forget_token, forget_user_tokens
+from .models import ArchivedSchedule, Bus, Route, Schedule, UserChange
+
+
+# Schedules embed route and bus details, so those writes invalidate them too.
+@receiver([post_save, post_delete], sender=Route)
+def invalidate_routes(sender, **kwargs):
+    cache.invalidate('routes', 'schedules')
+
+
+@receiver([post_save, post_delete], sender=Bus)
+def invalidate_buses(sender, **kwargs):
+    cache.invalidate('buses', 'schedules')
+
+
+@receiver([post_save, post_delete], sender=Schedule)
+def invalidate_schedules(sender, **kwargs):
+    cache.invalidate('schedules')
+
+
+# Keep the analytics rollups in step with catalog edits. Booking changes
+# adjust them in myapp.services instead.
+@receiver(pre_save, sender=Schedule)
+def remember_rollup_key(sender, instance, **kwargs):
+    instance._previous_rollup_key = (
+        Schedule.objects.filter(pk=instance.pk).only('route', 'bus', 'departure_time').first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Schedule)
+def rebuild_schedule_rollups(sender, instance, **kwargs):
+    analytics.rebuild_schedule(instance)
+    previous = getattr(instance, '_previous_rollup_key', None)
+    if previous is not None and (previous.route_id, previous.bus_id, previous.departure_time) != (
+        instance.route_id, instance.bus_id, instance.departure_time
+    ):
+        analytics.rebuild_schedule(previous)
+
+
+@receiver(post_delete, sender=Schedule)
+def rebuild_deleted_schedule_rollups(sender, instance, **kwargs):
+    # Archived schedules keep counting; their rollup row stays as it is.
+    if ArchivedSchedule.objects.filter(pk=instance.pk).exists():
+        return
+    # After commit, because the route or bus may be deleted by the same cascade.
+    transaction.on_commit(lambda: analytics.rebuild_schedule(instance))
+
+
+@receiver(pre_save, sender=Bus)
+def remember_total_seats(sender, instance, **kwargs):
+    instance._previous_total_seats = (
+        Bus.objects.filter(pk=instance.pk).values_list('total_seats', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Bus)
+def apply_capacity_change(sender, instance, created, **kwargs):
+    # Capacity counts towards every schedule of this bus, in its seat counter
+    # and its rollups; other edits, such as a rename, leave both as they are.
+    previous = getattr(instance, '_previous_total_seats', None)
+    if previous is not None and previous != instance.total_seats:
+        services.recompute_bus_seats(instance.pk)
+        analytics.rebuild(bus_id=instance.pk)
+
+
+# Remember deletions for the dashboard's since= deltas; booking deletions
+# are recorded by myapp.services.delete_booking.
+@receiver(post_delete, sender=Route)
+@receiver(post_delete, sender=Bus)
+@receiver(post_delete, sender=Schedule)
+@receiver(post_delete, sender=User)
+def record_deletion(sender, instance, **kwargs):
+    kind = {Route: 'routes', Bus: 'buses', Schedule: 'schedules', User: 'users'}[sender]
+    dashboard.record_deletion(kind, [instance.pk])
+
+
+# Users have no updated_at; stamp edits to the fields the dashboard sends so
+# they show up in its since= deltas. New users are found by date_joined.
+@receiver(post_save, sender=User)
+def record_user_change(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not {'username', 'is_staff'} & set(update_fields)):
+        return
+    UserChange.objects.update_or_create(user_id=instance.pk, defaults={'updated_at': timezone.now()})
+
+
+# Drop cached authentications on logout and whenever a user changes, e.g.
+# is deactivated or loses staff status.
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_changed_user(sender, instance, created, **kwargs):
+    if not created:
+        forget_user_tokens(instance)
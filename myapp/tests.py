@@ -1,3 +1,1157 @@
-from django.test import TestCase
+import base64
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from . import async_views, services, throttling
+from .Serializers import BookingSerializer
+from .authentication import CachedTokenAuthentication
+from .benchmarking import compare
+from .cache import acached_response, cached_response
+from .exceptions import SeatUnavailable
+from .metrics import registry
+from .middleware import ReplicaMiddleware
+from .models import (
+    ArchivedBooking, ArchivedSchedule, Booking, Bus, IdempotencyKey, OccupancyRollup, OutboxMessage, Route, Schedule,
+    SeatHold, Tombstone,
+)
+from .routers import ReplicaRouter, use_primary
+
+# Throttle buckets outlive each test's rollback while user ids repeat across
+# tests, so throttles stay off unless a test (ThrottleTests) sets rates.
+throttles_off = override_settings(THROTTLE_RATES={})
+
+
+def setUpModule():
+    throttles_off.enable()
+
+
+def tearDownModule():
+    throttles_off.disable()
+
+
+def make_schedule(total_seats=40, **kwargs):
+    route = Route.objects.create(from_location='Dar es Salaam', to_location='Morogoro', distance=200)
+    bus = Bus.objects.create(bus_number='BUS-001', bus_name='Express Deluxe', total_seats=total_seats)
+    defaults = {
+        'route': route,
+        'bus': bus,
+        'departure_time': timezone.now() + timedelta(days=1),
+        'price': 15000,
+        'available_seats': total_seats,
+    }
+    defaults.update(kwargs)
+    return Schedule.objects.create(**defaults)
+
+
+class SeatConflictTests(TestCase):
+    def setUp(self):
+        self.schedule = make_schedule()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('amina', password='pass12345'))
+
+    def test_booking_a_taken_seat_returns_409(self):
+        first = self.client.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 7})
+        second = self.client.post('/api/book/', {'schedule': self.schedule.pk, 'seat_number': 7})
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 409)
+        self.assertEqual(second.data['detail'], "Seat 7 is already booked")
+
+    def test_cancelled_seat_can_be_booked_again(self):
+        booking = self.client.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 7})
+        self.client.delete(f"/api/bookings/{booking.data['id']}/")
+
+        response = self.client.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 7})
+
+        self.assertEqual(response.status_code, 201)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_seats, 39)
+
+
+# SQLite serializes writers with table locks, so this only means something
+# against a backend with row locking (run it with DATABASE_URL set).
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentBookingTests(TransactionTestCase):
+    attempts = 200
+    workers = 16
+
+    def test_only_one_of_many_parallel_bookings_wins(self):
+        schedule = make_schedule()
+        users = [User.objects.create_user(f'user{i}', password='pass12345') for i in range(self.workers)]
+
+        def book(i):
+            client = APIClient()
+            client.force_authenticate(users[i % len(users)])
+            try:
+                response = client.post('/api/bookings/', {'schedule': schedule.pk, 'seat_number': 1})
+                return response.status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            statuses = list(pool.map(book, range(self.attempts)))
+
+        self.assertEqual(statuses.count(201), 1)
+        self.assertEqual(statuses.count(409), self.attempts - 1)
+        self.assertEqual(Booking.objects.filter(schedule=schedule, seat_number=1).count(), 1)
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.available_seats, 39)
+
+
+class SeatMapTests(TestCase):
+    def setUp(self):
+        self.schedule = make_schedule(total_seats=12)
+        user = User.objects.create_user('salma', password='pass12345')
+        for seat in (5, 6, 9):
+            Booking.objects.create(user=user, schedule=self.schedule, seat_number=seat)
+        Booking.objects.create(user=user, schedule=self.schedule, seat_number=1, status='cancelled')
+        self.url = f'/api/schedules/{self.schedule.pk}/available_seats/'
+
+    def test_list_encoding_is_the_default(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.json(), {'available_seats': [1, 2, 3, 4, 7, 8, 10, 11, 12]})
+
+    def test_compact_encodings(self):
+        ranges = self.client.get(self.url, {'encoding': 'ranges'}).json()
+        bitmap = self.client.get(self.url, {'encoding': 'bitmap'}).json()
+
+        self.assertEqual(ranges['available_seats'], '1-4,7-8,10-12')
+        # Seats 1-4, 7, 8 free in the first byte; 10-12 in the second.
+        self.assertEqual(base64.b64decode(bitmap['available_seats']), bytes([0b11001111, 0b00001110]))
+        self.assertEqual(bitmap['total_seats'], 12)
+
+
+class ListingTests(TestCase):
+    def setUp(self):
+        self.schedule = make_schedule()
+        self.later = Schedule.objects.create(
+            route=self.schedule.route,
+            bus=self.schedule.bus,
+            departure_time=self.schedule.departure_time + timedelta(days=7),
+            price=30000,
+            available_seats=40,
+        )
+
+    def test_lists_are_cursor_paginated(self):
+        response = self.client.get('/api/schedules/', {'page_size': 1})
+
+        self.assertEqual([s['id'] for s in response.data['results']], [self.schedule.pk])
+        self.assertEqual(self.client.get(response.data['next']).data['results'][0]['id'], self.later.pk)
+
+    def test_schedule_filters(self):
+        after = (self.schedule.departure_time + timedelta(days=1)).isoformat()
+
+        self.assertEqual(
+            [s['id'] for s in self.client.get('/api/schedules/', {'departure_after': after}).data['results']],
+            [self.later.pk],
+        )
+        self.assertEqual(
+            [s['id'] for s in self.client.get('/api/schedules/', {'max_price': '20000'}).data['results']],
+            [self.schedule.pk],
+        )
+        self.assertEqual(self.client.get('/api/schedules/', {'min_price': 'abc'}).status_code, 400)
+
+    def test_fields_selects_a_sparse_fieldset(self):
+        response = self.client.get('/api/schedules/', {'fields': 'id,price'})
+
+        self.assertEqual(set(response.data['results'][0]), {'id', 'price'})
+
+    def test_capacity_changes_update_the_seat_counters(self):
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_user('boss', is_staff=True))
+        services.create_booking(user=User.objects.create_user('traveller'), schedule=self.schedule, seat_number=1)
+        self.client.get('/api/schedules/')
+
+        response = admin.patch(f'/api/buses/{self.schedule.bus_id}/', {'total_seats': 50}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {s['id']: s['available_seats'] for s in self.client.get('/api/schedules/').data['results']},
+            {self.schedule.pk: 49, self.later.pk: 50},
+        )
+
+
+class ScheduleSearchTests(TestCase):
+    def test_search_returns_upcoming_departures_with_seats_left(self):
+        upcoming = make_schedule()
+        Schedule.objects.create(
+            route=upcoming.route, bus=upcoming.bus, price=15000, available_seats=0,
+            departure_time=upcoming.departure_time + timedelta(hours=1),
+        )
+        Schedule.objects.create(
+            route=upcoming.route, bus=upcoming.bus, price=15000, available_seats=40,
+            departure_time=timezone.now() - timedelta(hours=1),
+        )
+
+        response = self.client.get('/api/schedules/search/', {'from': 'Dar es Salaam', 'to': 'Morogoro'})
+        on_date = self.client.get('/api/schedules/search/', {
+            'from': 'Dar es Salaam', 'to': 'Morogoro', 'date': upcoming.departure_time.date().isoformat(),
+        })
+
+        self.assertEqual([s['id'] for s in response.data['results']], [upcoming.pk])
+        self.assertEqual([s['id'] for s in on_date.data['results']], [upcoming.pk])
+        self.assertEqual(self.client.get('/api/schedules/search/', {'from': 'Dar es Salaam'}).status_code, 400)
+
+
+class BulkBookingTests(TestCase):
+    def setUp(self):
+        self.schedule = make_schedule()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('group', password='pass12345'))
+
+    def test_books_all_seats_in_one_request(self):
+        response = self.client.post(
+            '/api/bookings/bulk/', {'schedule': self.schedule.pk, 'seat_numbers': [1, 2, 3]}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(b['seat_number'] for b in response.data), [1, 2, 3])
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_seats, 37)
+
+    def test_one_taken_seat_rejects_the_whole_group(self):
+        self.client.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 2})
+
+        response = self.client.post(
+            '/api/bookings/bulk/', {'legs': [{'schedule': self.schedule.pk, 'seat_numbers': [1, 2, 3]}]},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_seats, 39)
+
+
+class WriteTransactionTests(TestCase):
+    def test_failed_staff_booking_creates_no_user(self):
+        schedule = make_schedule()
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('clerk', is_staff=True))
+
+        with patch('myapp.services.create_booking', side_effect=SeatUnavailable(4)):
+            response = client.post('/api/bookings/', {
+                'schedule': schedule.pk, 'seat_number': 4, 'new_username': 'walkin', 'new_password': 'pass12345',
+            })
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(User.objects.filter(username='walkin').exists())
+
+    def test_registration_is_all_or_nothing(self):
+        with patch('myapp.views.issue_token', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            self.client.post('/api/register/', {
+                'username': 'amani', 'email': 'a@example.com', 'password': 'Kilimanjaro-5895', 'password2': 'Kilimanjaro-5895',
+            })
+
+        self.assertFalse(User.objects.filter(username='amani').exists())
+
+
+class CatalogImportExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', password='pass12345', is_staff=True))
+
+    def upload(self, kind, name, content):
+        return self.client.post(f'/api/import/{kind}/', {'file': SimpleUploadedFile(name, content.encode())})
+
+    def test_import_then_export_round_trips(self):
+        self.upload('routes', 'routes.csv', "from_location,to_location,distance\nDodoma,Singida,250\n")
+        self.upload('buses', 'buses.jsonl', '{"bus_number": "BUS-9", "bus_name": "Coastal", "total_seats": 30}\n')
+        response = self.upload(
+            'schedules', 'schedules.csv',
+            "from_location,to_location,bus_number,departure_time,price\n"
+            "Dodoma,Singida,BUS-9,2030-01-01T08:00:00+00:00,12000\n"
+            "Dodoma,Singida,BUS-9,2030-01-01T08:00:00+00:00,13000\n",
+        )
+
+        self.assertEqual(response.data, {'created': 1, 'updated': 0})
+        schedule = Schedule.objects.get()
+        self.assertEqual((schedule.price, schedule.available_seats), (13000, 30))
+
+        export = self.client.get('/api/export/schedules/', {'file_format': 'jsonl'})
+        self.assertEqual(
+            b''.join(export.streaming_content).decode(),
+            '{"from_location": "Dodoma", "to_location": "Singida", "bus_number": "BUS-9", '
+            '"departure_time": "2030-01-01T08:00:00+00:00", "price": "13000.00"}\n',
+        )
+
+    @override_settings(SERVE_ASGI=True)
+    def test_export_streams_asynchronously_under_asgi(self):
+        Bus.objects.bulk_create(Bus(bus_number=f'BUS-{i}', bus_name='Coastal' * 200, total_seats=30) for i in range(60))
+
+        export = self.client.get('/api/export/buses/')
+
+        self.assertTrue(export.is_async)
+
+        async def read():
+            return [chunk async for chunk in export.streaming_content]
+        chunks = async_to_sync(read)()
+        lines = b''.join(chunks).decode().splitlines()
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(lines[0], 'bus_number,bus_name,total_seats')
+        self.assertEqual(lines[1:], [f"BUS-{i},{'Coastal' * 200},30" for i in range(60)])
+
+    def test_invalid_rows_abort_the_import(self):
+        response = self.upload(
+            'buses', 'buses.csv', "bus_number,bus_name,total_seats\nBUS-1,One,40\nBUS-2,Two,many\n"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['rows'][0]['line'], 3)
+        self.assertFalse(Bus.objects.exists())
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.schedule = make_schedule()
+
+    def test_cached_list_is_invalidated_by_writes(self):
+        self.client.get('/api/routes/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/routes/')
+
+        Route.objects.create(from_location='Mbeya', to_location='Iringa', distance=300)
+
+        self.assertEqual(len(self.client.get('/api/routes/').data['results']), 2)
+
+    def test_booking_invalidates_schedule_listing(self):
+        self.client.get('/api/schedules/')
+        Booking.objects.create(user=User.objects.create_user('juma'), schedule=self.schedule, seat_number=1)
+        services.adjust_available_seats(self.schedule.pk, -1)
+
+        self.assertEqual(self.client.get('/api/schedules/').data['results'][0]['available_seats'], 39)
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get('/api/schedules/')['ETag']
+
+        response = self.client.get('/api/schedules/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('neema', password='pass12345')
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_repeat_lookups_skip_the_database(self):
+        self.auth.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(0):
+            user, _ = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+
+    def test_logout_and_deactivation_invalidate(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(client.get('/api/bookings/').status_code, 200)
+
+        client.post('/api/logout/')
+        self.assertEqual(client.get('/api/bookings/').status_code, 401)
+
+        token = Token.objects.create(user=self.user)
+        self.auth.authenticate_credentials(token.key)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(token.key)
+
+    @override_settings(AUTH_TOKEN_TTL=60)
+    def test_expired_tokens_are_rejected(self):
+        Token.objects.filter(pk=self.token.pk).update(created=timezone.now() - timedelta(minutes=5))
+
+        with self.assertRaisesMessage(AuthenticationFailed, 'Token has expired.'):
+            self.auth.authenticate_credentials(self.token.key)
+        self.assertFalse(Token.objects.exists())
+
+
+class LoginTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('rehema', password='pass12345')
+        self.credentials = {'username': 'rehema', 'password': 'pass12345'}
+
+    def login(self):
+        return self.client.post('/api/login/', self.credentials, content_type='application/json')
+
+    def test_token_is_fetched_or_created_in_one_query(self):
+        with self.assertNumQueries(2):
+            first = self.login()
+        with self.assertNumQueries(2):
+            again = self.login()
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data['token'], again.data['token'])
+        self.assertEqual(Token.objects.get(user=self.user).key, first.data['token'])
+
+    @override_settings(AUTH_TOKEN_TTL=60)
+    def test_expired_token_is_replaced(self):
+        old = Token.objects.create(user=self.user)
+        Token.objects.filter(pk=old.pk).update(created=timezone.now() - timedelta(minutes=5))
+
+        token = self.login().data['token']
+
+        self.assertNotEqual(token, old.key)
+        self.assertEqual(list(Token.objects.values_list('key', flat=True)), [token])
+
+    @override_settings(AUTH_TOKEN_TTL=0)
+    def test_token_already_expired_on_issue_is_replaced_once(self):
+        with self.assertNumQueries(2):
+            first = self.login()
+        second = self.login()
+
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(first.data['token'], second.data['token'])
+        self.assertEqual(list(Token.objects.values_list('key', flat=True)), [second.data['token']])
+
+    @override_settings(
+        PASSWORD_HASHERS=['myapp.hashers.TunedArgon2PasswordHasher', 'myapp.hashers.TunedPBKDF2PasswordHasher'],
+        ARGON2_MEMORY_COST=8 * 1024,
+    )
+    def test_password_is_rehashed_to_the_configured_hasher(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+        self.assertEqual(self.login().status_code, 200)
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2$argon2id$v=19$m=8192,t=2,p=1$'))
+        self.assertEqual(self.login().status_code, 200)
+
+
+class BookingListQueryTests(TestCase):
+    def test_booking_list_query_count_is_constant(self):
+        staff = User.objects.create_user('admin', password='pass12345', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(staff)
+        schedule = make_schedule()
+        for seat in range(1, 31):
+            user = User.objects.create_user(f'rider{seat}')
+            Booking.objects.create(user=user, schedule=schedule, seat_number=seat)
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/bookings/')
+
+        self.assertEqual(len(response.data['results']), 30)
+        self.assertEqual(response.data['results'][0]['schedule_route'], 'Dar es Salaam → Morogoro')
+        self.assertEqual(response.data['results'][0]['user_username'], 'rider30')
+
+
+class SeatEventsTests(TestCase):
+    def setUp(self):
+        self.schedule = make_schedule(total_seats=4)
+        self.user = User.objects.create_user('baraka', password='pass12345')
+
+    def book(self, seat):
+        with self.captureOnCommitCallbacks(execute=True):
+            return services.create_booking(user=self.user, schedule=self.schedule, seat_number=seat)
+
+    def cancel(self, booking):
+        with self.captureOnCommitCallbacks(execute=True):
+            services.cancel_booking(booking)
+
+    @override_settings(SERVE_ASGI=True)
+    async def test_stream_sends_snapshot_then_deltas(self):
+        response = await self.async_client.get(f'/api/schedules/{self.schedule.pk}/seat-events/')
+        stream = response.streaming_content
+
+        snapshot = (await anext(stream)).decode()
+        booking = await sync_to_async(self.book)(2)
+        taken = (await anext(stream)).decode()
+        await sync_to_async(self.cancel)(booking)
+        released = (await anext(stream)).decode()
+        await stream.aclose()
+
+        self.assertIn('"available_seats": [1, 2, 3, 4]', snapshot)
+        self.assertTrue(taken.startswith('event: seat-taken\n'))
+        self.assertIn('"seats": [2]', taken)
+        self.assertTrue(released.startswith('event: seat-released\n'))
+
+    def test_refused_under_wsgi(self):
+        response = self.client.get(f'/api/schedules/{self.schedule.pk}/seat-events/')
+
+        self.assertEqual(response.status_code, 503)
+
+
+class SeatHoldTests(TestCase):
+    def setUp(self):
+        self.schedule = make_schedule(total_seats=6)
+        self.holder = APIClient()
+        self.holder.force_authenticate(User.objects.create_user('holder', password='pass12345'))
+        self.other = APIClient()
+        self.other.force_authenticate(User.objects.create_user('other', password='pass12345'))
+        self.seats_url = f'/api/schedules/{self.schedule.pk}/available_seats/'
+
+    def hold(self, client, seats):
+        return client.post('/api/holds/', {'schedule': self.schedule.pk, 'seat_numbers': seats}, format='json')
+
+    def test_held_seats_are_hidden_from_others_and_cannot_be_booked(self):
+        self.assertEqual(self.hold(self.holder, [1, 2]).status_code, 201)
+
+        self.assertEqual(self.other.get(self.seats_url).data['available_seats'], [3, 4, 5, 6])
+        self.assertEqual(self.holder.get(self.seats_url).data['available_seats'], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(self.hold(self.other, [2]).status_code, 409)
+        response = self.other.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 1})
+        self.assertEqual(response.status_code, 409)
+
+    def test_confirm_turns_holds_into_bookings(self):
+        self.hold(self.holder, [1, 2])
+
+        response = self.holder.post('/api/holds/confirm/', {'schedule': self.schedule.pk}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(b['seat_number'] for b in response.data), [1, 2])
+        self.assertFalse(SeatHold.objects.exists())
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_seats, 4)
+
+    def test_confirm_validates_seat_numbers(self):
+        self.hold(self.holder, [1, 2])
+
+        def confirm(seats):
+            return self.holder.post('/api/holds/confirm/', {'schedule': self.schedule.pk, 'seat_numbers': seats}, format='json')
+
+        self.assertEqual(confirm(12).status_code, 400)
+        self.assertEqual(confirm('12').status_code, 400)
+        self.assertEqual(confirm([0]).status_code, 400)
+        missing = confirm([2, 12])
+        self.assertEqual(missing.status_code, 410)
+        self.assertEqual(missing.data['detail'], 'No active hold on seats: 12')
+        self.assertEqual(SeatHold.objects.count(), 2)
+
+    def test_expired_holds_release_lazily_and_are_swept(self):
+        self.hold(self.holder, [1])
+        SeatHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.other.get(self.seats_url).data['available_seats'], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(self.holder.post('/api/holds/confirm/', {'schedule': self.schedule.pk}).status_code, 410)
+        call_command('expire_seat_holds', stdout=StringIO())
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_sweep_keeps_holds_extended_after_it_selected_them(self):
+        self.hold(self.holder, [1])
+        SeatHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        def extend_then_release(holds):
+            # hold_seats extending the row, having checked expiry a moment earlier.
+            SeatHold.objects.update(expires_at=timezone.now() + timedelta(minutes=5))
+            return services.release_holds(holds)
+
+        with patch('myapp.management.commands.expire_seat_holds.release_holds', side_effect=extend_then_release):
+            call_command('expire_seat_holds', stdout=StringIO())
+
+        self.assertEqual(list(services.active_holds().values_list('seat_number', flat=True)), [1])
+
+
+@override_settings(METRICS_TOKEN='scrape-me', PERF_SERVER_TIMING=True)
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        make_schedule()
+
+    def test_records_per_view_metrics_and_server_timing(self):
+        response = self.client.get('/api/schedules/')
+        metrics = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-me')
+
+        self.assertIn('db;dur=', response['Server-Timing'])
+        body = metrics.content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="schedule-list",method="GET"} 1', body)
+        self.assertIn('http_requests_total{view="schedule-list",method="GET",status="200"} 1', body)
+        self.assertIn('http_request_db_queries_total{view="schedule-list",method="GET"} 1', body)
+
+    def test_metrics_require_the_scrape_token(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    @override_settings(PERF_N_PLUS_ONE_THRESHOLD=3)
+    def test_repeated_identical_sql_is_flagged(self):
+        schedule = Schedule.objects.get()
+        with self.assertLogs('myapp.performance', 'WARNING') as logs:
+            for seat in range(1, 5):
+                Booking.objects.create(user=User.objects.create_user(f'r{seat}'), schedule=schedule, seat_number=seat)
+            # Without route_label the serializer walks booking.schedule.route per row.
+            client = APIClient()
+            client.force_authenticate(User.objects.create_user('boss', is_staff=True))
+            with patch.object(BookingSerializer, 'get_schedule_route', lambda s, obj: str(obj.schedule.route)):
+                client.get('/api/bookings/')
+
+        self.assertIn('Possible N+1 in GET booking-list', logs.output[0])
+
+
+class LoadTestDataTests(TestCase):
+    def test_seeded_bookings_fit_their_schedules(self):
+        call_command('seed_data', schedules=30, users=5, bookings=200, stdout=StringIO())
+
+        self.assertEqual(User.objects.filter(username__startswith='loadtest_').count(), 5)
+        self.assertTrue(User.objects.get(username='loadtest_0').check_password('loadtest-pass'))
+        self.assertTrue(Booking.objects.exists())
+        for schedule in Schedule.objects.select_related('bus'):
+            seats = schedule.booking_set.filter(status='confirmed').values_list('seat_number', flat=True)
+            self.assertEqual(len(seats), len(set(seats)))
+            self.assertEqual(schedule.available_seats, schedule.bus.total_seats - len(seats))
+
+    def test_compare_flags_slower_p95_lower_throughput_and_errors(self):
+        baseline = {'GET /schedules/': {'p95': 10.0, 'throughput': 100.0, 'errors': 0}}
+        within = {'GET /schedules/': {'p95': 11.0, 'throughput': 90.0, 'errors': 0}}
+        worse = {'GET /schedules/': {'p95': 15.0, 'throughput': 50.0, 'errors': 2}}
+
+        self.assertEqual(compare(within, baseline, tolerance=0.2), [])
+        self.assertEqual(len(compare(worse, baseline, tolerance=0.2)), 3)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.departed = make_schedule(departure_time=timezone.now() - timedelta(days=40))
+        self.upcoming = Schedule.objects.create(
+            route=self.departed.route, bus=self.departed.bus, departure_time=timezone.now() + timedelta(days=1),
+            price=15000, available_seats=40,
+        )
+        self.user = User.objects.create_user('traveller', password='pass12345')
+        self.old = Booking.objects.create(user=self.user, schedule=self.departed, seat_number=3)
+        Booking.objects.create(user=self.user, schedule=self.departed, seat_number=4, status='cancelled')
+        self.live = Booking.objects.create(user=self.user, schedule=self.upcoming, seat_number=3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_moves_departed_schedules_and_bookings_keeping_ids(self):
+        out = StringIO()
+        call_command('archive_departures', days=30, batch_size=1, stdout=out)
+
+        self.assertIn('Archived 1 schedule(s) and 2 booking(s)', out.getvalue())
+        self.assertEqual(list(Schedule.objects.values_list('pk', flat=True)), [self.upcoming.pk])
+        self.assertEqual(list(Booking.objects.values_list('pk', flat=True)), [self.live.pk])
+        self.assertTrue(ArchivedSchedule.objects.filter(pk=self.departed.pk).exists())
+        archived = ArchivedBooking.objects.get(pk=self.old.pk)
+        self.assertEqual((archived.schedule_id, archived.seat_number, archived.status), (self.departed.pk, 3, 'confirmed'))
+
+    def test_history_is_only_served_when_asked_for(self):
+        call_command('archive_departures', days=30, stdout=StringIO())
+
+        live = self.client.get('/api/bookings/').data['results']
+        history = self.client.get('/api/bookings/history/', {'status': 'confirmed'}).data['results']
+
+        self.assertEqual([row['id'] for row in live], [self.live.pk])
+        self.assertEqual([row['id'] for row in history], [self.old.pk])
+        self.assertEqual(history[0]['schedule_route'], live[0]['schedule_route'])
+        self.assertEqual(history[0]['schedule_route'], 'Dar es Salaam → Morogoro')
+
+    def test_dry_run_changes_nothing(self):
+        out = StringIO()
+        call_command('archive_departures', days=30, dry_run=True, stdout=out)
+
+        self.assertIn('Would archive 1 schedule(s) and 2 booking(s)', out.getvalue())
+        self.assertFalse(ArchivedSchedule.objects.exists())
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class MaintenanceCommandTests(TransactionTestCase):
+    # Outside a test transaction, catalog reads would be routed to
+    # 'replica1', which has no connection here.
+    def test_commands_read_the_primary(self):
+        schedule = make_schedule()
+        Booking.objects.create(user=User.objects.create_user('traveller'), schedule=schedule, seat_number=3)
+
+        call_command('reconcile_seats', stdout=StringIO())
+        call_command('rebuild_analytics', stdout=StringIO())
+        call_command('archive_departures', days=30, dry_run=True, stdout=StringIO())
+
+        schedule.refresh_from_db(using='default')
+        self.assertEqual(schedule.available_seats, 39)
+        self.assertEqual(OccupancyRollup.objects.using('default').get().confirmed, 1)
+
+
+delivered = []
+
+
+def record_delivery(message):
+    delivered.append((message.topic, message.payload['seat_number'], message.idempotency_key))
+
+
+def fail_delivery(message):
+    raise RuntimeError("mail server down")
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        delivered.clear()
+        self.schedule = make_schedule()
+        self.user = User.objects.create_user('traveller', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_booking_changes_are_queued_in_the_same_transaction(self):
+        booking_id = self.client.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 5}).data['id']
+        self.client.post('/api/bookings/bulk/', {'schedule': self.schedule.pk, 'seat_numbers': [6, 7]}, format='json')
+        self.client.delete(f'/api/bookings/{booking_id}/')
+        # A rejected booking leaves nothing behind.
+        self.client.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 6})
+
+        messages = list(OutboxMessage.objects.order_by('id').values_list('topic', 'payload'))
+        self.assertEqual([(topic, payload['seat_number']) for topic, payload in messages], [
+            ('booking.confirmed', 5), ('booking.confirmed', 6), ('booking.confirmed', 7), ('booking.cancelled', 5),
+        ])
+        self.assertEqual(messages[0][1]['booking'], booking_id)
+
+    @override_settings(OUTBOX_HANDLERS={'booking.confirmed': ['myapp.tests.record_delivery']})
+    def test_worker_delivers_each_message_once(self):
+        self.client.post('/api/bookings/bulk/', {'schedule': self.schedule.pk, 'seat_numbers': [1, 2, 3]}, format='json')
+
+        call_command('process_outbox', workers=2, batch_size=2, stdout=StringIO())
+        call_command('process_outbox', stdout=StringIO())
+
+        self.assertEqual(sorted(seat for _, seat, _ in delivered), [1, 2, 3])
+        self.assertEqual(len({key for _, _, key in delivered}), 3)
+        self.assertFalse(OutboxMessage.objects.filter(processed_at__isnull=True).exists())
+
+    @override_settings(OUTBOX_HANDLERS={'*': ['myapp.tests.fail_delivery']}, OUTBOX_RETRY_DELAY=60)
+    def test_failures_are_retried_later(self):
+        self.client.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 5})
+
+        with self.assertLogs('myapp.outbox', 'WARNING'):
+            call_command('process_outbox', stdout=StringIO())
+
+        message = OutboxMessage.objects.get()
+        self.assertIsNone(message.processed_at)
+        self.assertEqual(message.attempts, 1)
+        self.assertIn('mail server down', message.last_error)
+        self.assertGreater(message.available_at, timezone.now() + timedelta(seconds=50))
+
+    @override_settings(OUTBOX_HANDLERS={'*': ['myapp.tests.fail_delivery']}, OUTBOX_MAX_ATTEMPTS=1, METRICS_TOKEN='scrape-me')
+    def test_dead_letters_are_reported_then_purged(self):
+        self.client.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 5})
+        out = StringIO()
+
+        with self.assertLogs('myapp.outbox', 'ERROR'):
+            call_command('process_outbox', stdout=out)
+        scraped = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-me').content.decode()
+
+        self.assertIn('1 message(s) gave up after 1 attempts', out.getvalue())
+        self.assertIn('1 dead letter(s) left undelivered', out.getvalue())
+        self.assertIn('\noutbox_dead_letters 1\n', scraped)
+        OutboxMessage.objects.update(created_at=timezone.now() - timedelta(days=31))
+        out = StringIO()
+        call_command('process_outbox', stdout=out)
+        self.assertIn('Purged 0 processed message(s) and 1 dead letter(s)', out.getvalue())
+        self.assertFalse(OutboxMessage.objects.exists())
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.schedule = make_schedule()
+        self.user = User.objects.create_user('traveller', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, key, seat=5, url='/api/bookings/'):
+        return self.client.post(url, {'schedule': self.schedule.pk, 'seat_number': seat}, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_booking_replays_the_first_response(self):
+        first = self.post('retry-1')
+        with self.assertNumQueries(1):
+            retry = self.post('retry-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_seats, 39)
+
+    def test_retried_cancel_replays_instead_of_failing(self):
+        booking_id = self.post('book').data['id']
+        first = self.client.delete(f'/api/bookings/{booking_id}/', HTTP_IDEMPOTENCY_KEY='cancel')
+        retry = self.client.delete(f'/api/bookings/{booking_id}/', HTTP_IDEMPOTENCY_KEY='cancel')
+
+        self.assertEqual((first.status_code, retry.status_code), (200, 200))
+        self.assertEqual(self.client.delete(f'/api/bookings/{booking_id}/').status_code, 400)
+
+    def test_errors_are_replayed_and_their_writes_undone(self):
+        Booking.objects.create(user=User.objects.create_user('other'), schedule=self.schedule, seat_number=5)
+
+        self.assertEqual(self.post('taken', url='/api/book/').status_code, 409)
+        Booking.objects.all().delete()
+        # The seat is free now, but the retry gets the first answer back.
+        self.assertEqual(self.post('taken', url='/api/book/').status_code, 409)
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(self.post('fresh', url='/api/book/').status_code, 200)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.post('same')
+        self.assertEqual(self.post('same', seat=6).status_code, 422)
+
+    def test_keys_are_per_user_and_expire(self):
+        self.post('shared')
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other'))
+        self.assertEqual(other.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 6},
+                                    HTTP_IDEMPOTENCY_KEY='shared').status_code, 201)
+
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        call_command('expire_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post('shared', seat=7).status_code, 201)
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        self.schedule = make_schedule(departure_time=timezone.now() - timedelta(days=2))
+        self.user = User.objects.create_user('traveller', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.admin = APIClient()
+        self.admin.force_authenticate(User.objects.create_user('boss', is_staff=True))
+
+    def book_and_cancel(self):
+        self.client.post('/api/bookings/bulk/', {'schedule': self.schedule.pk, 'seat_numbers': [1, 2, 3]}, format='json')
+        booking = Booking.objects.get(seat_number=3)
+        self.client.delete(f'/api/bookings/{booking.pk}/')
+
+    def rollup(self):
+        return list(OccupancyRollup.objects.values('day', 'route', 'bus', 'schedules', 'seats', 'confirmed', 'cancelled', 'revenue'))
+
+    def test_report_is_served_from_rollups_kept_current_by_bookings(self):
+        self.book_and_cancel()
+
+        with self.assertNumQueries(2):
+            response = self.admin.get('/api/analytics/', {'group': 'route'})
+
+        self.assertEqual(response.status_code, 200)
+        totals = response.data['totals']
+        self.assertEqual((totals['schedules'], totals['seats'], totals['confirmed'], totals['cancelled']), (1, 40, 2, 1))
+        self.assertEqual(totals['revenue'], 30000)
+        self.assertEqual((totals['load_factor'], totals['cancellation_rate']), (0.05, 0.3333))
+        self.assertEqual(response.data['results'][0]['label'], 'Dar es Salaam → Morogoro')
+
+    def test_incremental_rollups_match_a_full_rebuild(self):
+        self.book_and_cancel()
+        self.schedule.price = 20000
+        self.schedule.save()
+        incremental = self.rollup()
+
+        call_command('rebuild_analytics', stdout=StringIO())
+
+        self.assertEqual(incremental, self.rollup())
+        self.assertEqual(incremental[0]['revenue'], 40000)
+
+    def test_deleting_a_booking_without_a_rollup_row(self):
+        self.client.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 1})
+        OccupancyRollup.objects.all().delete()
+
+        self.admin.delete(f'/api/bookings/{Booking.objects.get().pk}/')
+
+        rollup = self.rollup()[0]
+        self.assertEqual((rollup['confirmed'], rollup['cancelled'], rollup['revenue']), (0, 0, 0))
+
+    def test_only_capacity_changes_rebuild_bus_rollups(self):
+        bus = self.schedule.bus
+        with patch('myapp.signals.analytics.rebuild') as rebuild:
+            bus.bus_name = 'Coastal Line'
+            bus.save()
+        self.assertFalse(rebuild.called)
+
+        bus.total_seats = 50
+        bus.save()
+        self.assertEqual(self.rollup()[0]['seats'], 50)
+
+    def test_archiving_keeps_the_numbers(self):
+        self.book_and_cancel()
+        before = self.rollup()
+
+        call_command('archive_departures', days=1, stdout=StringIO())
+        self.assertEqual(self.rollup(), before)
+        call_command('rebuild_analytics', stdout=StringIO())
+        self.assertEqual(self.rollup(), before)
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get('/api/analytics/').status_code, 403)
+        self.assertEqual(self.admin.get('/api/analytics/', {'group': 'week'}).status_code, 400)
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        self.schedule = make_schedule(available_seats=39)
+        self.user = User.objects.create_user('traveller', password='pass12345')
+        self.booking = Booking.objects.create(user=self.user, schedule=self.schedule, seat_number=1)
+        self.admin = APIClient()
+        self.admin.force_authenticate(User.objects.create_user('boss', is_staff=True))
+
+    def test_full_snapshot_is_normalized(self):
+        with self.assertNumQueries(6):
+            response = self.admin.get('/api/dashboard/')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertTrue(data['full'])
+        self.assertEqual(data['schedules'][self.schedule.pk]['route'], self.schedule.route_id)
+        self.assertEqual(data['routes'][self.schedule.route_id]['from_location'], 'Dar es Salaam')
+        self.assertEqual(data['bookings'][self.booking.pk]['user'], self.user.pk)
+        self.assertIsNone(data['bookings_next'])
+
+    def test_delta_sends_only_changes_and_deletions(self):
+        since = self.admin.get('/api/dashboard/').data['server_time']
+        hour_ago = timezone.now() - timedelta(hours=1)
+        for model in (Route, Bus, Schedule, Booking):
+            model.objects.update(updated_at=hour_ago)
+        User.objects.update(date_joined=hour_ago)
+
+        self.admin.delete(f'/api/bookings/{self.booking.pk}/')
+        route = Route.objects.create(from_location='Dodoma', to_location='Arusha', distance=430)
+        response = self.admin.get('/api/dashboard/', {'since': since.isoformat()})
+        self.user.is_staff = True
+        self.user.save()
+        users = self.admin.get('/api/dashboard/', {'since': since.isoformat()}).data['users']
+
+        data = response.data
+        self.assertFalse(data['full'])
+        self.assertEqual(list(data['routes']), [route.pk])
+        self.assertEqual(data['buses'], {})
+        self.assertEqual(data['users'], {})
+        # Releasing the seat touched the schedule.
+        self.assertEqual(data['schedules'][self.schedule.pk]['available_seats'], 40)
+        self.assertEqual(data['deleted']['bookings'], [self.booking.pk])
+        self.assertEqual(users, {self.user.pk: {'id': self.user.pk, 'username': 'traveller', 'is_staff': True}})
+
+    def test_stale_since_gets_a_full_snapshot(self):
+        Tombstone.objects.create(kind='routes', object_id=99, deleted_at=timezone.now() - timedelta(days=30))
+        response = self.admin.get('/api/dashboard/', {'since': (timezone.now() - timedelta(days=30)).isoformat()})
+
+        self.assertTrue(response.data['full'])
+        self.assertFalse(Tombstone.objects.exists())
+
+    def test_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/dashboard/').status_code, 403)
+        self.assertEqual(self.admin.get('/api/dashboard/', {'since': 'yesterday'}).status_code, 400)
+
+
+class AsyncCatalogViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.schedule = make_schedule(total_seats=4)
+        Schedule.objects.create(
+            route=self.schedule.route, bus=self.schedule.bus, price=20000, available_seats=4,
+            departure_time=self.schedule.departure_time + timedelta(days=1),
+        )
+        self.user = User.objects.create_user('neema', password='pass12345')
+        self.token = Token.objects.create(user=self.user)
+        self.factory = AsyncRequestFactory()
+
+    async def assert_same_as_drf(self, view, path, params):
+        expected = await sync_to_async(self.client.get)(path, params)
+        await sync_to_async(cache.clear)()
+        response = await view(self.factory.get(path, params))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), expected.json())
+        self.assertEqual(response['ETag'], expected['ETag'])
+        return expected.json()
+
+    async def test_schedule_pages_match_the_drf_views(self):
+        first = await self.assert_same_as_drf(async_views.schedule_list, '/api/schedules/', {'page_size': 1})
+        cursor = parse_qs(urlparse(first['next']).query)['cursor'][0]
+        await self.assert_same_as_drf(async_views.schedule_list, '/api/schedules/', {'page_size': 1, 'cursor': cursor})
+        await self.assert_same_as_drf(
+            async_views.schedule_search, '/api/schedules/search/', {'from': 'Dar es Salaam', 'to': 'Morogoro'},
+        )
+
+        response = await async_views.schedule_search(self.factory.get('/api/schedules/search/', {'from': 'Dodoma'}))
+        self.assertEqual(response.status_code, 400)
+
+    async def test_seat_map_skips_the_users_own_holds(self):
+        other = await User.objects.acreate(username='juma')
+        await SeatHold.objects.acreate(user=other, schedule=self.schedule, seat_number=1, expires_at=timezone.now() + timedelta(minutes=5))
+        await SeatHold.objects.acreate(user=self.user, schedule=self.schedule, seat_number=2, expires_at=timezone.now() + timedelta(minutes=5))
+        path = f'/api/schedules/{self.schedule.pk}/available_seats/'
+
+        anonymous = await async_views.available_seats(self.factory.get(path), pk=self.schedule.pk)
+        signed_in = await async_views.available_seats(
+            self.factory.get(path, headers={'Authorization': f'Token {self.token.key}'}), pk=self.schedule.pk,
+        )
+        bad_token = await async_views.available_seats(
+            self.factory.get(path, headers={'Authorization': 'Token nope'}), pk=self.schedule.pk,
+        )
+        missing = await async_views.available_seats(self.factory.get(path), pk=0)
+
+        self.assertEqual(json.loads(anonymous.content), {'available_seats': [3, 4]})
+        self.assertEqual(json.loads(signed_in.content), {'available_seats': [2, 3, 4]})
+        self.assertEqual(bad_token.status_code, 401)
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_writes_fall_through_to_drf(self):
+        request = self.factory.post(
+            '/api/schedules/', {}, content_type='application/json', headers={'Authorization': f'Token {self.token.key}'},
+        )
+        response = await async_views.schedule_list(request)
+
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def test_catalog_reads_go_to_replicas(self):
+        self.assertEqual(self.router.db_for_read(Schedule), 'replica1')
+        self.assertEqual(self.router.db_for_read(ArchivedBooking), 'replica1')
+        self.assertEqual(self.router.db_for_read(Booking), 'default')
+        self.assertEqual(self.router.db_for_write(Schedule), 'default')
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Schedule), 'default')
+
+    def test_cached_catalog_responses_are_built_from_the_primary(self):
+        seen = []
+
+        def build():
+            seen.append(self.router.db_for_read(Schedule))
+            return Response({})
+
+        async def abuild():
+            seen.append(self.router.db_for_read(Schedule))
+            return {}
+
+        cached_response(self.factory.get('/api/schedules/'), ('schedules',), build)
+        async_to_sync(acached_response)(self.factory.get('/api/schedules/search/'), ('schedules',), abuild)
+
+        self.assertEqual(seen, ['default', 'default'])
+        self.assertEqual(self.router.db_for_read(Schedule), 'replica1')
+
+    def test_writers_read_their_writes_from_the_primary(self):
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Schedule))
+            return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+        middleware = ReplicaMiddleware(view)
+        mine, theirs = {'HTTP_AUTHORIZATION': 'Token mine'}, {'HTTP_AUTHORIZATION': 'Token theirs'}
+        middleware(self.factory.get('/api/schedules/', **mine))
+        middleware(self.factory.post('/api/bookings/', **mine))
+        middleware(self.factory.get('/api/schedules/', **mine))
+        middleware(self.factory.get('/api/schedules/', **theirs))
+
+        self.assertEqual(seen, ['replica1', 'default', 'default', 'replica1'])
+
+
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttling.local_buckets.clear()
+        self.user = User.objects.create_user('rehema', password='pass12345')
+        self.schedule = make_schedule(total_seats=4)
+
+    def login(self, username):
+        return self.client.post('/api/login/', {'username': username, 'password': 'pass12345'}, content_type='application/json')
+
+    @override_settings(THROTTLE_RATES={'login': '4/min', 'login_username': '2/min'})
+    @patch.object(throttling.LocalBuckets, 'clock', return_value=1000.0)
+    def test_login_is_throttled_per_username_and_ip(self, clock):
+        User.objects.create_user('juma', password='pass12345')
+        self.assertEqual(self.login('rehema').status_code, 200)
+        self.assertEqual(self.login('rehema').status_code, 200)
+        with self.assertNumQueries(0):
+            rejected = self.login('rehema')
+        self.assertEqual(self.login('juma').status_code, 200)
+        over_ip = self.login('juma')
+
+        self.assertEqual(rejected.status_code, 429)
+        self.assertEqual(rejected['Retry-After'], '30')
+        self.assertEqual(over_ip.status_code, 429)
+        self.assertEqual(over_ip['Retry-After'], '15')
+
+    @override_settings(THROTTLE_RATES={'booking': '1/min'})
+    def test_booking_writes_are_throttled_per_user(self):
+        other = User.objects.create_user('juma')
+        client, other_client = APIClient(), APIClient()
+        client.force_authenticate(self.user)
+        other_client.force_authenticate(other)
+
+        first = client.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 1}, format='json')
+        listed = client.get('/api/bookings/')
+        second = client.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 2}, format='json')
+        theirs = other_client.post('/api/bookings/', {'schedule': self.schedule.pk, 'seat_number': 3}, format='json')
+
+        self.assertEqual((first.status_code, listed.status_code, second.status_code), (201, 200, 429))
+        self.assertEqual(theirs.status_code, 201)
+        self.assertEqual(Booking.objects.count(), 2)
+
+    @override_settings(THROTTLE_RATES={'seatmap': '1/hour'})
+    def test_async_seat_map_shares_the_drf_views_bucket(self):
+        path = f'/api/schedules/{self.schedule.pk}/available_seats/'
+        self.assertEqual(self.client.get(path).status_code, 200)
+
+        response = async_to_sync(async_views.available_seats)(AsyncRequestFactory().get(path), pk=self.schedule.pk)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '3600')
+
+    @override_settings(
+        THROTTLE_RATES={'login': '100/min', 'login_username': '3/min'},
+        PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    )
+    def test_username_limit_survives_a_flood_of_new_ips_and_usernames(self):
+        throttling.local_buckets['login'] = throttling.LocalBuckets(max_keys=3)
+        throttling.local_buckets['login_username'] = throttling.LocalBuckets(max_keys=3)
+        statuses = []
+        for i in range(8):
+            body = {'username': 'rehema', 'password': 'wrong'}
+            statuses.append(self.client.post('/api/login/', body, content_type='application/json', REMOTE_ADDR=f'10.0.0.{i}').status_code)
+            body = {'username': f'guess{i}', 'password': 'wrong'}
+            self.client.post('/api/login/', body, content_type='application/json', REMOTE_ADDR=f'10.0.1.{i}')
+
+        self.assertEqual(statuses, [400] * 3 + [429] * 5)
+
+    def test_anonymous_clients_are_keyed_on_the_address_the_proxy_saw(self):
+        factory = RequestFactory()
+
+        def ident(num_proxies, forwarded_for):
+            request = factory.get('/', REMOTE_ADDR='10.1.1.1', HTTP_X_FORWARDED_FOR=forwarded_for)
+            with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': num_proxies}):
+                return throttling.LoginThrottle().get_ident(request)
+
+        self.assertEqual(ident(0, 'spoofed'), '10.1.1.1')
+        self.assertEqual(ident(1, 'spoofed, 203.0.113.7'), '203.0.113.7')
+        self.assertEqual(ident(1, '203.0.113.7'), '203.0.113.7')
+
+    def test_least_recently_used_buckets_are_evicted_first(self):
+        store = throttling.LocalBuckets(max_keys=10)
+        store.take('hot', 5, 1.0)
+        for i in range(30):
+            store.take(f'ip{i}', 5, 1.0)
+            store.take('hot', 5, 1.0)
+
+        self.assertLessEqual(len(store.buckets), 10)
+        self.assertIn('hot', store.buckets)
+        self.assertNotIn('ip0', store.buckets)
+
+    def test_buckets_refill_over_time(self):
+        for store in (throttling.LocalBuckets(), throttling.CacheBuckets()):
+            with patch.object(store, 'clock', return_value=1000.0) as now:
+                self.assertEqual([store.take('k', 2, 1.0) for _ in range(3)], [0, 0, 1.0])
+                now.return_value = 1000.5
+                self.assertEqual(store.take('k', 2, 1.0), 0.5)
+                now.return_value = 1002.0
+                self.assertEqual(store.take('k', 2, 1.0), 0)
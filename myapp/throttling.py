@@ -0,0 +1,139 @@
+"""
+Token-bucket throttles for the endpoints scrapers and password guessers hit
+hardest: booking writes, login and registration, and seat maps.
+
+A THROTTLE_RATES entry "N/period" lets a client burst N requests, then
+refills its bucket at N per period. Clients are users when signed in and
+IP addresses otherwise, taken from X-Forwarded-For only as far as
+REST_FRAMEWORK's NUM_PROXIES trusts it. The buckets live in process memory
+by default: plain dict reads and writes without a lock, so a rejection
+costs no I/O. In exchange, concurrent threads can let an extra request or
+two through, and each worker process counts on its own. Each scope keeps
+its own MAX_KEYS buckets and evicts the least recently used, so a flood of
+new IPs can't reset the per-username login limit. With THROTTLE_BACKEND =
+"cache" the buckets live in the shared cache (CACHE_URL) instead, so limits
+hold across workers. Rejected requests get a 429 with Retry-After.
+"""
+import hashlib
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import SimpleRateThrottle
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Buckets each scope keeps in memory before evicting the least recently used.
+MAX_KEYS = 10000
+
+
+class LocalBuckets:
+    """Up to ``max_keys`` buckets in this process's memory, least recently used evicted first."""
+    shared = False
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, max_keys=MAX_KEYS):
+        self.buckets = {}
+        self.max_keys = max_keys
+
+    def take(self, key, capacity, refill):
+        """Take a token from ``key``'s bucket; returns 0, or the seconds until one is available."""
+        now = self.clock()
+        # Popping and re-inserting keeps the dict in least-recently-used order.
+        tokens, stamp = self.buckets.pop(key, None) or (capacity, now)
+        tokens = min(capacity, tokens + (now - stamp) * refill)
+        wait = 0 if tokens >= 1 else (1 - tokens) / refill
+        if not wait:
+            tokens -= 1
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            self.evict()
+        return wait
+
+    def evict(self):
+        # A tenth at a time, so a flood doesn't evict on every request.
+        excess = len(self.buckets) - self.max_keys + self.max_keys // 10
+        for key in list(islice(self.buckets, excess)):
+            self.buckets.pop(key, None)
+
+
+class CacheBuckets:
+    """Buckets in the shared cache; concurrent requests may still race on one key."""
+    shared = True
+    clock = staticmethod(time.time)
+
+    def take(self, key, capacity, refill):
+        now = self.clock()
+        tokens, stamp = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - stamp) * refill)
+        wait = 0 if tokens >= 1 else (1 - tokens) / refill
+        if not wait:
+            tokens -= 1
+        cache.set(key, (tokens, now), int((capacity - tokens) / refill) + 1)
+        return wait
+
+
+local_buckets = {}
+cache_buckets = CacheBuckets()
+
+
+def buckets(scope):
+    if settings.THROTTLE_BACKEND == 'cache':
+        return cache_buckets
+    store = local_buckets.get(scope)
+    if store is None:
+        store = local_buckets.setdefault(scope, LocalBuckets())
+    return store
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """DRF throttle for ``scope``'s THROTTLE_RATES entry; no entry, no limit."""
+    writes_only = False
+
+    def get_rate(self):
+        # Read per request, so settings overrides apply.
+        return settings.THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'throttle:{self.scope}:user:{user.pk}'
+        return f'throttle:{self.scope}:ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        if self.rate is None or (self.writes_only and request.method in SAFE_METHODS):
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        self.wait_time = buckets(self.scope).take(key, self.num_requests, self.num_requests / self.duration)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+class BookingThrottle(TokenBucketThrottle):
+    """Booking, cancellation and seat-hold writes; reads are not counted."""
+    scope = 'booking'
+    writes_only = True
+
+
+class LoginThrottle(TokenBucketThrottle):
+    scope = 'login'
+
+
+class LoginUsernameThrottle(TokenBucketThrottle):
+    """Attempts per username, whichever IP they come from."""
+    scope = 'login_username'
+
+    def get_cache_key(self, request, view):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if not username:
+            return None
+        return f'throttle:{self.scope}:' + hashlib.sha256(str(username).encode()).hexdigest()
+
+
+class SeatMapThrottle(TokenBucketThrottle):
+    scope = 'seatmap'
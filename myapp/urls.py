@@ -1,8 +1,9 @@
+from django.conf import settings
 from django.urls import path
-from . import views
-from .views import RegisterView, LoginView, LogoutView
+from . import async_views, views
+from .views import RegisterView, LoginView, LogoutView, CatalogImportView, CatalogExportView, DashboardView
 from rest_framework.routers import DefaultRouter
-from .views import RouteViewSet, BusViewSet, ScheduleViewSet, BookingViewSet, UserViewSet
+from .views import RouteViewSet, BusViewSet, ScheduleViewSet, BookingViewSet, UserViewSet, SeatHoldViewSet
 
 
 urlpatterns = [
@@ -10,8 +11,14 @@ urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
+    path('import/<str:kind>/', CatalogImportView.as_view(), name='catalog-import'),
+    path('export/<str:kind>/', CatalogExportView.as_view(), name='catalog-export'),
 
     path('available-seats/<int:pk>/', ScheduleViewSet.as_view({'get': 'available_seats'}), name='available-seats'),
+    path('schedules/<int:pk>/seat-events/', views.seat_events, name='seat-events'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('analytics/', views.analytics_report, name='analytics'),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
 ]
 
 router =   DefaultRouter()
@@ -20,5 +27,16 @@ router.register(r'buses', BusViewSet)
 router.register(r'schedules', ScheduleViewSet)
 router.register(r'bookings', BookingViewSet)
 router.register(r'users', UserViewSet)
+router.register(r'holds', SeatHoldViewSet)
 
 urlpatterns += router.urls
+
+if settings.SERVE_ASGI:
+    # Ahead of the router, so GETs for these take the async views; other
+    # methods fall through to the DRF views (see myapp.async_views).
+    urlpatterns = [
+        path('schedules/', async_views.schedule_list, name='schedule-list-async'),
+        path('schedules/search/', async_views.schedule_search, name='schedule-search-async'),
+        path('schedules/<int:pk>/available_seats/', async_views.available_seats, name='schedule-available-seats-async'),
+        path('available-seats/<int:pk>/', async_views.available_seats, name='available-seats-async'),
+    ] + urlpatterns
@@ -1,46 +1,94 @@
+import asyncio
+import io
+import json
+
 from django.shortcuts import render
-from rest_framework.decorators import api_view, action, permission_classes
+from django.urls import reverse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework.decorators import api_view, action, authentication_classes, permission_classes, throttle_classes
 from rest_framework.response import Response
-from .models import Route, Bus, Schedule, Booking
+from rest_framework.views import APIView
+from .models import ArchivedBooking, OccupancyRollup, Route, Bus, Schedule, Booking, SeatHold
 from .Serializers import (
     RouteSerializer,
+    ArchivedBookingSerializer,
     BookingSerializer,
     BusSerializer,
     ScheduleSerializer,
     RegisterSerializer,
     LoginSerializer,
     UserSerializer,
+    BulkBookingSerializer,
+    HoldConfirmSerializer,
+    HoldRequestSerializer,
+    SeatHoldSerializer,
 )
-from rest_framework import generics, viewsets, permissions, serializers
+from rest_framework import generics, mixins, viewsets, permissions, serializers
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
-from .permissions import IsAdminOrReadOnly
+from .authentication import issue_token
+from .permissions import HasMetricsToken, IsAdminOrReadOnly
+from .metrics import gauge, registry
+from . import analytics, catalog_io, dashboard, events, outbox, services
+from .seatmap import SeatMap
+from .cache import CatalogCacheMixin, cached_response
+from .filters import changed_since, filter_bookings, filter_rollups, filter_schedules, search_schedules
+from .pagination import StableCursorPagination
+from .idempotency import idempotent
+from .throttling import BookingThrottle, LoginThrottle, LoginUsernameThrottle, SeatMapThrottle
 from django.utils import timezone
+from django.db import transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Concat
 # Create your views here.
-class RouteViewSet(viewsets.ModelViewSet):
+class RouteViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
     permission_classes = [IsAdminOrReadOnly]
+    cache_resources = ('routes',)
 
-class BusViewSet(viewsets.ModelViewSet):
+class BusViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Bus.objects.all()
     serializer_class = BusSerializer
     permission_classes = [IsAdminOrReadOnly]
+    cache_resources = ('buses',)
+
+# A booking's "from → to" label, built in SQL for live and archived bookings.
+ROUTE_LABEL = Concat(
+    'schedule__route__from_location', Value(' → '), 'schedule__route__to_location', output_field=CharField(),
+)
+
 
 class BookingViewSet(viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
+    throttle_classes = [BookingThrottle]
 
     def get_queryset(self):
         user = self.request.user
-        if user.is_staff:
-            return Booking.objects.all()
-        return Booking.objects.filter(user=user)
+        queryset = Booking.objects.all() if user.is_staff else Booking.objects.filter(user=user)
+        # One query per page: the user is joined and the route label is built
+        # in SQL instead of walking booking.schedule.route per row.
+        queryset = queryset.select_related('user').annotate(route_label=ROUTE_LABEL)
+        if self.action == 'list':
+            queryset = filter_bookings(queryset, self.request.query_params, allow_user=user.is_staff)
+        return queryset
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
+        # Staff may create the booking's user as well; keep both or neither.
+        with transaction.atomic():
+            serializer.save(user=self.get_booking_user())
+
+    def get_booking_user(self):
+        """Staff book on behalf of a selected or newly created user."""
         booking_user = self.request.user
 
         if self.request.user.is_staff:
@@ -69,7 +117,29 @@ class BookingViewSet(viewsets.ModelViewSet):
                     {"detail": "Select an existing user or provide new_username and new_password."}
                 )
 
-        serializer.save(user=booking_user)
+        return booking_user
+
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def bulk(self, request):
+        serializer = BulkBookingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        legs = {leg['schedule']: leg['seat_numbers'] for leg in serializer.validated_data['legs']}
+        with transaction.atomic():
+            bookings = services.create_bookings(self.get_booking_user(), legs)
+        return Response(BookingSerializer(bookings, many=True).data, status=201)
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """Bookings on archived (long departed) schedules; the list above only has live ones."""
+        user = request.user
+        queryset = ArchivedBooking.objects.all() if user.is_staff else ArchivedBooking.objects.filter(user=user)
+        queryset = filter_bookings(
+            queryset.select_related('user', 'schedule').annotate(route_label=ROUTE_LABEL),
+            request.query_params, allow_user=user.is_staff,
+        )
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(ArchivedBookingSerializer(page, many=True).data)
     
     def update(self, request, *args, **kwargs):
         # Only admins can edit bookings (change seat)
@@ -77,12 +147,14 @@ class BookingViewSet(viewsets.ModelViewSet):
             return Response({"detail": "You cannot edit bookings. Only cancel them."}, status=403)
         return super().update(request, *args, **kwargs)
     
+    @idempotent
     def destroy(self, request, *args, **kwargs):
         booking = self.get_object()
 
         # Admins perform a hard delete
         if request.user.is_staff:
-            return super().destroy(request, *args, **kwargs)
+            services.delete_booking(booking)
+            return Response(status=204)
 
         # Non-admins may only cancel their own bookings
         if booking.user != request.user:
@@ -92,51 +164,125 @@ class BookingViewSet(viewsets.ModelViewSet):
         if booking.status == 'cancelled':
             return Response({"detail": "Booking is already cancelled"}, status=400)
 
-        booking.status = 'cancelled'
-        booking.cancelled_at = timezone.now()
-        booking.save()
+        if not services.cancel_booking(booking):
+            return Response({"detail": "Booking is already cancelled"}, status=400)
 
         return Response({"detail": "Booking cancelled successfully"}, status=200)
 
 
-class ScheduleViewSet(viewsets.ModelViewSet):
+class ScheduleViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Schedule.objects.all()
     serializer_class = ScheduleSerializer
     permission_classes = [IsAdminOrReadOnly]
+    cursor_ordering = ('departure_time', 'id')
+    cache_resources = ('schedules',)
+
+    def get_queryset(self):
+        # Join route and bus so listing N schedules costs one query; seat
+        # availability is read from the denormalized Schedule.available_seats.
+        queryset = Schedule.objects.select_related('route', 'bus')
+        if self.action == 'list':
+            queryset = filter_schedules(queryset, self.request.query_params)
+        return queryset
 
     def perform_create(self, serializer):
         bus = serializer.validated_data.get('bus')
         serializer.save(available_seats=bus.total_seats)
 
-    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    def perform_update(self, serializer):
+        old_bus_id = serializer.instance.bus_id
+        with transaction.atomic():
+            schedule = serializer.save()
+            if schedule.bus_id != old_bus_id:
+                services.recompute_available_seats(schedule.pk)
+                schedule.refresh_from_db(fields=['available_seats'])
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def search(self, request):
+        def build():
+            queryset = search_schedules(self.get_queryset(), request.query_params)
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        return cached_response(request, self.cache_resources, build)
+
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny], throttle_classes=[SeatMapThrottle])
     def available_seats(self, request, pk=None):
+        encoding = request.query_params.get('encoding', 'list')
+        if encoding not in SeatMap.ENCODINGS:
+            return Response({"error": f"encoding must be one of {', '.join(SeatMap.ENCODINGS)}"}, status=400)
         schedule = self.get_object()
-        booked_seats = Booking.objects.filter(schedule=schedule, status='confirmed').values_list('seat_number', flat=True)
-        all_seats = [i for i in range(1, schedule.bus.total_seats + 1)]
-        available = [seat for seat in all_seats if seat not in booked_seats]
-        return Response({'available_seats': available})
+        return Response(SeatMap.for_schedule(schedule, request.user).as_response(encoding))
+
+
+class SeatHoldViewSet(mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """Hold seats for a few minutes while checking out, then confirm them."""
+    queryset = SeatHold.objects.all()
+    serializer_class = SeatHoldSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [BookingThrottle]
+
+    def get_queryset(self):
+        return services.active_holds().filter(user=self.request.user).order_by('expires_at', 'id')
+
+    def create(self, request):
+        serializer = HoldRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        schedule = serializer.validated_data['schedule']
+        seats = serializer.validated_data['seat_numbers']
+        minutes = serializer.validated_data.get('minutes', settings.SEAT_HOLD_MINUTES)
+
+        expires_at = services.hold_seats(request.user, schedule, seats, minutes)
+        return Response({'schedule': schedule.pk, 'seat_numbers': seats, 'expires_at': expires_at}, status=201)
+
+    def perform_destroy(self, instance):
+        services.release_holds(SeatHold.objects.filter(pk=instance.pk))
+
+    @action(detail=False, methods=['post'])
+    def confirm(self, request):
+        """Turn the caller's active holds on ``schedule`` (or some ``seat_numbers``) into bookings."""
+        serializer = HoldConfirmSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        schedule = serializer.validated_data['schedule']
+        requested = serializer.validated_data.get('seat_numbers')
+
+        holds = self.get_queryset().filter(schedule=schedule)
+        if requested:
+            holds = holds.filter(seat_number__in=requested)
+        seats = sorted(holds.values_list('seat_number', flat=True))
+        missing = sorted(set(requested or []) - set(seats))
+        if not seats or missing:
+            detail = f"No active hold on seats: {', '.join(map(str, missing))}" if missing else "No active holds to confirm"
+            return Response({"detail": detail}, status=410)
+
+        bookings = services.create_bookings(request.user, {schedule: seats})
+        return Response(BookingSerializer(bookings, many=True).data, status=201)
 
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all().order_by('username')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAdminUser]
+    cursor_ordering = 'username'
 
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
+    throttle_classes = (LoginThrottle,)
     serializer_class = RegisterSerializer
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.save()
-        token, created = Token.objects.get_or_create(user=user)
+        with transaction.atomic():
+            user = serializer.save()
+            token = issue_token(user)
         return Response({"token": token.key, "user_id": user.id, "username": user.username}, status=201)
 
 class LoginView(generics.GenericAPIView):
     permission_classes = (AllowAny,)
+    throttle_classes = (LoginThrottle, LoginUsernameThrottle)
     serializer_class = LoginSerializer
 
     def post(self, request):
@@ -144,9 +290,10 @@ class LoginView(generics.GenericAPIView):
         if serializer.is_valid():
             username = serializer.validated_data.get('username')
             password = serializer.validated_data.get('password')
-            user = authenticate(username=username, password=password)
+            # Rehashes the password if the hasher or its cost changed.
+            user = authenticate(request, username=username, password=password)
             if user:
-                token, created = Token.objects.get_or_create(user=user)
+                token = issue_token(user)
                 return Response({
                     "token": token.key,
                     "user_id": user.id,
@@ -165,14 +312,115 @@ class LogoutView(generics.GenericAPIView):
         Token.objects.filter(user=request.user).delete()
         return Response({"detail": "Logged out"})
 
+class CatalogImportView(APIView):
+    """Upload a CSV/JSONL file as ``file`` to upsert routes, buses or schedules."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, kind):
+        if kind not in catalog_io.FIELDS:
+            return Response({"error": "Unknown catalog"}, status=404)
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"file": "Upload a CSV or JSONL file."}, status=400)
+        file_format = request.query_params.get('file_format') or catalog_io.guess_format(upload.name)
+        if file_format not in catalog_io.FORMATS:
+            return Response({"file_format": f"Must be one of {', '.join(catalog_io.FORMATS)}"}, status=400)
+
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        try:
+            totals = catalog_io.import_catalog(
+                kind, stream, file_format, dry_run=request.query_params.get('dry_run') == 'true'
+            )
+        except catalog_io.CatalogImportError as exc:
+            return Response({"error": str(exc), "rows": exc.errors[:100]}, status=400)
+        return Response(totals, status=201)
+
+
+class CatalogExportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, kind):
+        if kind not in catalog_io.FIELDS:
+            return Response({"error": "Unknown catalog"}, status=404)
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in catalog_io.FORMATS:
+            return Response({"file_format": f"Must be one of {', '.join(catalog_io.FORMATS)}"}, status=400)
+
+        content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+        # Under ASGI, Django reads a sync iterator to the end before sending it.
+        export = catalog_io.aexport_catalog if settings.SERVE_ASGI else catalog_io.export_catalog
+        response = StreamingHttpResponse(export(kind, file_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{file_format}"'
+        return response
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def analytics_report(request):
+    """Load factor, revenue and cancellation rate per ``?group=day|route|bus``, read from the rollups."""
+    group = request.query_params.get('group', 'day')
+    if group not in analytics.GROUPS:
+        return Response({"group": f"Must be one of {', '.join(analytics.GROUPS)}"}, status=400)
+    queryset = filter_rollups(OccupancyRollup.objects.all(), request.query_params)
+    return Response(analytics.report(queryset, group))
+
+
+class DashboardView(APIView):
+    """
+    Routes, buses, schedules, users and the latest bookings page as id maps
+    in one request; with ``?since=<server_time of the last response>`` only
+    what changed, plus ``deleted`` ids. See myapp.dashboard.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        now = timezone.now()
+        since = changed_since(request.query_params)
+        if dashboard.is_delta(since, now):
+            return Response({
+                'server_time': now,
+                'full': False,
+                **dashboard.entity_maps(since),
+                'bookings': dashboard.changed_bookings(since),
+                'deleted': dashboard.deletions(since),
+            })
+
+        dashboard.purge_tombstones(now)
+        paginator = StableCursorPagination()
+        page = paginator.paginate_queryset(Booking.objects.values(*dashboard.BOOKING_FIELDS), request, view=self)
+        # Older bookings are fetched page by page from the booking list.
+        paginator.base_url = request.build_absolute_uri(reverse('booking-list'))
+        return Response({
+            'server_time': now,
+            'full': True,
+            **dashboard.entity_maps(),
+            'bookings': {row['id']: row for row in page},
+            'bookings_next': paginator.get_next_link(),
+        })
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([HasMetricsToken])
+def metrics(request):
+    """Prometheus scrape endpoint for the PerformanceMiddleware counters and outbox dead letters."""
+    body = registry.render() + gauge(
+        'outbox_dead_letters', "Outbox messages undelivered after OUTBOX_MAX_ATTEMPTS.", outbox.dead_letters().count(),
+    )
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @api_view(['GET','POST'])
 def route_list(request):
-    routes = Route.objects.all()
-    serializer = RouteSerializer(routes, many=True)
-    return Response(serializer.data)
+    def build():
+        serializer = RouteSerializer(Route.objects.all(), many=True)
+        return Response(serializer.data)
+    return cached_response(request, ('routes',), build)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([BookingThrottle])
+@idempotent
 def book_ticket(request):
     serializer = BookingSerializer(data=request.data)
     if serializer.is_valid():
@@ -182,13 +430,57 @@ def book_ticket(request):
 
 @api_view(['GET'])
 def available_seats(request, schedule_id):
+    encoding = request.query_params.get('encoding', 'list')
+    if encoding not in SeatMap.ENCODINGS:
+        return Response({"error": f"encoding must be one of {', '.join(SeatMap.ENCODINGS)}"}, status=400)
     try:
-        schedule = Schedule.objects.get(id=schedule_id)
+        schedule = Schedule.objects.select_related('bus').get(id=schedule_id)
     except Schedule.DoesNotExist:
         return Response({"error": "Schedule not found"}, status=404)
 
-    booked_seats = Booking.objects.filter(schedule=schedule, status='confirmed').values_list('seat_number', flat=True)
-    all_seats = [i for i in range(1, schedule.bus.total_seats + 1)]
-    available = [seat for seat in all_seats if seat not in booked_seats]
-    return Response({'available_seats': available})
+    return Response(SeatMap.for_schedule(schedule, request.user).as_response(encoding))
+
+
+
+@transaction.non_atomic_requests
+async def seat_events(request, pk):
+    """
+    Server-sent events for one schedule's seat map: a ``snapshot`` of the
+    free seats followed by ``seat-taken`` / ``seat-released`` deltas. Only
+    served through ASGI: under WSGI, Django reads an async stream to the end
+    before sending it, so this endless one would tie up a worker for good.
+    """
+    if not settings.SERVE_ASGI:
+        return JsonResponse({"error": "Seat events need the ASGI server"}, status=503)
+    try:
+        schedule = await Schedule.objects.select_related('bus').aget(pk=pk)
+    except Schedule.DoesNotExist:
+        return JsonResponse({"error": "Schedule not found"}, status=404)
+
+    broker = events.get_broker()
+
+    async def stream():
+        # Subscribe before reading the snapshot so no change slips between.
+        subscription = broker.subscribe(events.schedule_channel(schedule.pk))
+        try:
+            unavailable = [seat async for seat in SeatMap.unavailable_seats(schedule)]
+            snapshot = SeatMap(schedule.bus.total_seats, unavailable).as_response()
+            yield _sse('snapshot', {'schedule': schedule.pk, **snapshot})
+            while True:
+                try:
+                    message = await subscription.get(timeout=settings.SEAT_EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse(message['type'], message)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
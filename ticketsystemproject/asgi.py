@@ -2,6 +2,8 @@
 ASGI config for ticketsystemproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with ``gunicorn -c gunicorn_asgi.conf.py ticketsystemproject.asgi:application``;
+SERVE_ASGI routes the hot catalog reads to myapp.async_views.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -12,5 +14,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ticketsystemproject.settings')
+os.environ.setdefault('SERVE_ASGI', 'true')
 
 application = get_asgi_application()
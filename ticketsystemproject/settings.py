@@ -6,6 +6,9 @@ import os
 from pathlib import Path
 from urllib.parse import parse_qs, urlparse
 
+from corsheaders.defaults import default_headers
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,12 +44,19 @@ INSTALLED_APPS = [
 ]
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'myapp.authentication.CachedTokenAuthentication',
     ),
-
+    'DEFAULT_PAGINATION_CLASS': 'myapp.pagination.StableCursorPagination',
+    'PAGE_SIZE': 50,
+    # Proxies in front of the app (Render's load balancer is one). Throttles
+    # read client IPs that many entries from the end of X-Forwarded-For; 0
+    # ignores the header, which clients can set to anything.
+    'NUM_PROXIES': int(os.environ.get("NUM_PROXIES", "0")),
 }
 
 MIDDLEWARE = [
+    'myapp.middleware.PerformanceMiddleware',
+    'myapp.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -67,6 +77,7 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
 
 ROOT_URLCONF = 'ticketsystemproject.urls'
 
@@ -88,32 +99,60 @@ TEMPLATES = [
 WSGI_APPLICATION = 'ticketsystemproject.wsgi.application'
 
 
+# Set by ticketsystemproject/asgi.py. Under ASGI the hot catalog reads are
+# served by myapp.async_views, and database connections aren't kept open
+# between requests, which Django doesn't support there; use ?pool=true.
+SERVE_ASGI = os.environ.get("SERVE_ASGI", "false").lower() == "true"
+
+
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-database_url = os.environ.get("DATABASE_URL", "").strip()
-
-if database_url:
-    parsed = urlparse(database_url)
+def postgres_database(url):
+    """A DATABASES entry for a postgresql:// URL."""
+    parsed = urlparse(url)
     query_params = parse_qs(parsed.query)
     db_options = {
         "sslmode": query_params.get("sslmode", ["require"])[0],
     }
     if "channel_binding" in query_params:
         db_options["channel_binding"] = query_params["channel_binding"][0]
-    DATABASES = {
-        "default": {
-            "ENGINE": "django.db.backends.postgresql",
-            "NAME": parsed.path.lstrip("/"),
-            "USER": parsed.username or "",
-            "PASSWORD": parsed.password or "",
-            "HOST": parsed.hostname or "",
-            "PORT": str(parsed.port or "5432"),
-            "ATOMIC_REQUESTS": True,
-            "CONN_MAX_AGE": 600,
-            "CONN_HEALTH_CHECKS": True,
-            "OPTIONS": db_options,
+    # Optional psycopg pool (needs psycopg[pool]): DATABASE_POOL=true and
+    # DATABASE_POOL_MIN_SIZE / _MAX_SIZE / _TIMEOUT, or the same as URL
+    # parameters (?pool=true&pool_max_size=4), which take precedence. Every
+    # worker process has its own pool, so workers * max size must stay under
+    # the server's connection cap. Pooling replaces CONN_MAX_AGE.
+    def pool_param(name, default):
+        return query_params.get(name, [os.environ.get(f"DATABASE_{name.upper()}", default)])[0]
+
+    db_pool = pool_param("pool", "false").lower() == "true"
+    if db_pool:
+        db_options["pool"] = {
+            "min_size": int(pool_param("pool_min_size", "1")),
+            "max_size": int(pool_param("pool_max_size", "4")),
+            # Seconds a request waits for a free connection before failing.
+            "timeout": float(pool_param("pool_timeout", "10")),
         }
+    return {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": parsed.path.lstrip("/"),
+        "USER": parsed.username or "",
+        "PASSWORD": parsed.password or "",
+        "HOST": parsed.hostname or "",
+        "PORT": str(parsed.port or "5432"),
+        # No ATOMIC_REQUESTS: reads run in autocommit, and writes open
+        # their own short transactions (myapp.services and the views).
+        "CONN_MAX_AGE": 0 if SERVE_ASGI or db_pool else 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": db_options,
+    }
+
+
+database_url = os.environ.get("DATABASE_URL", "").strip()
+
+if database_url:
+    DATABASES = {
+        "default": postgres_database(database_url),
     }
 else:
     # Local fallback when DATABASE_URL is not set.
@@ -121,11 +160,132 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # Take the write lock when a transaction starts, so concurrent
+            # bookings wait for it instead of failing with "database is locked".
+            "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 20},
         }
     }
 
-    
+# Optional read replicas of DATABASE_URL, comma-separated in the same format.
+# Catalog, booking history and analytics reads go to a random replica (see
+# myapp.routers); bookings, writes and a client's reads for
+# REPLICA_STICKY_SECONDS after it wrote stay on the primary.
+DATABASE_REPLICAS = []
+for number, replica_url in enumerate(
+    (url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()), start=1
+):
+    alias = f"replica{number}"
+    # Tests read the replicas through the test copy of the primary.
+    DATABASES[alias] = {**postgres_database(replica_url), "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICAS.append(alias)
 
+DATABASE_ROUTERS = ["myapp.routers.ReplicaRouter"]
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", "10"))
+
+
+# Cache
+# The in-process cache is per worker; set CACHE_URL (e.g. redis://localhost:6379/0)
+# so catalog invalidations reach every worker (needs the redis package).
+
+cache_url = os.environ.get("CACHE_URL", "").strip()
+
+if cache_url:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": cache_url,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        }
+    }
+
+CATALOG_CACHE_TIMEOUT = int(os.environ.get("CATALOG_CACHE_TIMEOUT", "60"))
+
+# Token-bucket throttles (myapp.throttling), per user or, when anonymous, per
+# IP: "N/period" allows bursts of N, refilled at N per period; an empty rate
+# turns that throttle off. Buckets are kept per worker unless
+# THROTTLE_BACKEND is "cache", which shares them through CACHES.
+THROTTLE_BACKEND = os.environ.get("THROTTLE_BACKEND", "local")
+THROTTLE_RATES = {
+    scope: os.environ.get(f"THROTTLE_{scope.upper()}_RATE", default) or None
+    for scope, default in {
+        "booking": "30/min",         # booking, cancellation and seat-hold writes
+        "login": "30/min",           # login and registration attempts per IP
+        "login_username": "10/min",  # login attempts per username
+        "seatmap": "120/min",        # seat-map reads
+    }.items()
+}
+
+# Request instrumentation (myapp.middleware.PerformanceMiddleware). /api/metrics/
+# is served to scrapers sending "Authorization: Bearer $METRICS_TOKEN".
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+PERF_SERVER_TIMING = os.environ.get("PERF_SERVER_TIMING", str(DEBUG)).lower() == "true"
+PERF_N_PLUS_ONE_THRESHOLD = int(os.environ.get("PERF_N_PLUS_ONE_THRESHOLD", "10"))
+
+# Seat-map push: broker class (see myapp.events) and SSE keepalive interval.
+SEAT_EVENTS_BROKER = os.environ.get("SEAT_EVENTS_BROKER", "myapp.events.InProcessBroker")
+SEAT_EVENTS_HEARTBEAT = int(os.environ.get("SEAT_EVENTS_HEARTBEAT", "15"))
+
+# Seat holds: default and maximum minutes a seat can be held before booking.
+SEAT_HOLD_MINUTES = int(os.environ.get("SEAT_HOLD_MINUTES", "10"))
+SEAT_HOLD_MAX_MINUTES = int(os.environ.get("SEAT_HOLD_MAX_MINUTES", "30"))
+
+# Days after departure before archive_departures moves a schedule and its
+# bookings out of the live tables.
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "30"))
+
+# Outbox: topic -> dotted paths of handlers called with each OutboxMessage
+# by process_outbox ("*" receives every topic), e.g.
+# {"booking.confirmed": ["tickets.handlers.send_receipt"]}. Failed messages
+# are retried after OUTBOX_RETRY_DELAY seconds, doubling each time, up to
+# OUTBOX_MAX_ATTEMPTS; messages out of attempts are kept as dead letters for
+# OUTBOX_DEAD_LETTER_RETENTION_DAYS so they can be inspected.
+OUTBOX_HANDLERS = {}
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_DELAY = int(os.environ.get("OUTBOX_RETRY_DELAY", "30"))
+OUTBOX_RETENTION_DAYS = int(os.environ.get("OUTBOX_RETENTION_DAYS", "7"))
+OUTBOX_DEAD_LETTER_RETENTION_DAYS = int(os.environ.get("OUTBOX_DEAD_LETTER_RETENTION_DAYS", "30"))
+
+# Seconds a response stored under an Idempotency-Key is replayed to retries.
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", str(24 * 60 * 60)))
+
+# Days deletions are remembered for dashboard ?since= deltas; older clients
+# get a full snapshot instead.
+DASHBOARD_DELTA_DAYS = int(os.environ.get("DASHBOARD_DELTA_DAYS", "7"))
+
+# Seconds a token -> user lookup stays cached, and optional token lifetime.
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get("AUTH_TOKEN_CACHE_TIMEOUT", "300"))
+AUTH_TOKEN_TTL = int(os.environ["AUTH_TOKEN_TTL"]) if os.environ.get("AUTH_TOKEN_TTL") else None
+if AUTH_TOKEN_TTL is not None and AUTH_TOKEN_TTL <= 0:
+    raise ImproperlyConfigured("AUTH_TOKEN_TTL must be a positive number of seconds; leave it unset for no expiry.")
+
+
+# Password hashing. PASSWORD_HASHER picks the hasher for new passwords:
+# "pbkdf2" (Django's default) or "argon2" (needs argon2-cffi; much cheaper per
+# login at the costs below). Passwords stored with the other hasher or with
+# other costs are rehashed transparently when their owner next logs in.
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "pbkdf2")
+# Argon2id costs; the defaults are OWASP's minimum (19 MiB, 2 passes, 1 lane).
+ARGON2_TIME_COST = int(os.environ.get("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.environ.get("ARGON2_MEMORY_COST", str(19 * 1024)))
+ARGON2_PARALLELISM = int(os.environ.get("ARGON2_PARALLELISM", "1"))
+# Unset keeps Django's default iteration count.
+PBKDF2_ITERATIONS = int(os.environ["PBKDF2_ITERATIONS"]) if os.environ.get("PBKDF2_ITERATIONS") else None
+
+PASSWORD_HASHERS = [
+    "myapp.hashers.TunedPBKDF2PasswordHasher",
+    "myapp.hashers.TunedArgon2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+if PASSWORD_HASHER == "argon2":
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(1))
 
 
 # Password validation